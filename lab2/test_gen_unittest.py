@@ -51,13 +51,13 @@ class TestGenStr(unittest.TestCase):
         Test if generated strings are random
         """
         random.seed(0)
-        data_num = 10
+        data_num = 1000
         charset = string.ascii_letters
-        length = 5
+        length = 8
 
-        got = [gen_str(data_num, charset, length) for _ in range(1000)]
+        got = gen_str(data_num, charset, length).split('\n')[:-1]
 
-        self.assertTrue(len(set(got)) == len(got))
+        self.assertTrue(len(set(got)) == len(got) == data_num)
 
     def test_seed_str(self):
         """
@@ -94,11 +94,11 @@ class TestGenInt(unittest.TestCase):
         Test if generated integers are random
         """
         random.seed(0)
-        data_num = 10
+        data_num = 1000
 
-        got = [gen_int(data_num) for _ in range(1000)]
+        got = gen_int(data_num).split('\n')[:-1]
 
-        self.assertTrue(len(set(got)) == len(got))
+        self.assertTrue(len(set(got)) == len(got) == data_num)
 
     def test_seed_int(self):
         """
@@ -136,15 +136,15 @@ class TestGenFloat(unittest.TestCase):
         Test if generated floats are random
         """
         random.seed(0)
-        data_num = 10
+        data_num = 1000
         distribution = 'uniform'
         min_value = 0
         max_value = 1
 
-        got = [gen_float(data_num, distribution, min_value,
-                         max_value, 0, 0) for _ in range(1000)]
+        got = gen_float(data_num, distribution, min_value,
+                        max_value, 0, 0).split('\n')[:-1]
 
-        self.assertTrue(len(set(got)) == len(got))
+        self.assertTrue(len(set(got)) == len(got) == data_num)
 
     def test_seed_float(self):
         """
@@ -5,11 +5,57 @@ This script allows the user to generate random strings or numbers
 seed, type of generated data and output execution time.
 
 For strings user can specify length of the strings, and character set.
+With --length-dist the lengths are drawn from a uniform, normal or
+empirical distribution instead, and each batch of strings is cut from a
+single buffer of random characters.
+With --unique duplicate strings are rejected by a Bloom filter sized from
+the number of strings, strings for a file are written batch by batch so
+memory use is the filter and one batch, and the achieved uniqueness is
+checked exactly by an external sort-merge.
+
+With --from-file the rows are random lines of an existing file, drawn with
+or without replacement through an mmap of the file and a line offset
+index cached next to it.
+
+With --sqlite the rows are inserted straight into a SQLite table in large
+batched transactions instead of being written as text.
+
+With --profile the generation and writing are profiled, and pstats data
+and collapsed stacks for flamegraph tools are saved.
 
 For float numbers user can specify distribution - uniform or normal, and
 parameters of distribution - min and max value for uniform, mean and
 standard deviation for normal distribution.
 
+The data is generated by one of several engines: classic (the reference
+per-row generators), bulk (draws whole batches at once) and numpy (when
+installed, numbers only). The output depends on the seed and the engine.
+With --secure the data is drawn from os.urandom in batches (secure engine)
+and cannot be reproduced.
+With --engine auto the fastest engine is picked from calibration runs
+cached per host. With an explicit --seed, auto always picks the bulk
+engine, so seeded output does not depend on the host.
+
+With --checkpoint-every the output file is flushed and a checkpoint with
+the random state is saved periodically, and --resume continues an
+interrupted run with byte-identical output.
+
+With --index a row offset index (every K-th row with --index-stride) is
+written to FILENAME.idx during generation, and the rows subcommand
+(gen.py rows file start stop) reads any range of rows through it.
+
+With --jobs many datasets described in a JSON or TOML file (with the same
+options as the command line) are generated by a pool of worker processes
+in one run, followed by a per-dataset timing summary.
+
+With --follow the data is generated until interrupted, and --rate limits
+the output to the given number of rows per second.
+
+The verify subcommand (gen.py verify [options] [input]) reads generated
+data in one pass and in constant memory, and runs chi-square tests on
+characters or digits, a Kolmogorov-Smirnov test on floats and estimates
+the duplicate rate.
+
 This file can also be imported as a module and contains the following
 functions:
 
@@ -17,29 +63,108 @@ functions:
     * gen_str - returns random generated strings
     * gen_int - returns random generated integers
     * gen_float - returns random generated floats
+    * gen_str_bulk, gen_int_bulk, gen_float_bulk - bulk engine generators
+    * gen_int_numpy, gen_float_numpy - numpy engine generators
+    * gen_str_secure, gen_int_secure, gen_float_secure - secure engine generators
+    * secure_indices - returns unbiased secure random integers from a range
+    * gen_str_lengths - returns random generated strings of given lengths
+    * draw_lengths - returns string lengths drawn from a length distribution
+    * gen_str_unique - returns random generated strings not generated before
+    * count_distinct - returns the number of distinct lines using sort-merge
+    * build_line_index - writes offsets of lines of a file to a sidecar file
+    * read_rows - returns a range of rows of a file using its sidecar index
+    * floyd_sample - returns distinct random integers from a range
+    * load_sqlite - inserts generated rows into a SQLite table
+    * collapse_pstats - returns collapsed stacks derived from pstats data
+    * run - generates data and writes it to the selected output
+    * run_jobs - generates the datasets of a job spec file in a worker pool
+    * generate - returns rows of the data type selected in arguments
+    * select_engine - returns the fastest engine for the job parameters
+    * stream - writes generated rows batch by batch, optionally rate-limited
+    * write_checkpointed - writes generated rows to a file with checkpoints
+    * verify - checks generated data for randomness in one pass
     * main - the main function of the script
 """
 import argparse
+import collections
+import contextlib
+import functools
+import heapq
+import importlib.util
+import itertools
+import io
+import json
+import math
+import mmap
+import operator
+import os
 import string
+import struct
 import random
 import sys
 import time
+from array import array
 
+BATCH_SIZE = 10000
+MAX_BATCH_SIZE = 1000000
+TICK = 0.01
+CHUNK_SIZE = 1 << 22
+KS_BINS = 1 << 16
+CHAR_SAMPLE = 1 << 16
+BLOOM_ERROR_RATE = 0.01
+RUN_SIZE = 1 << 17
+MERGE_FAN_IN = 256
+INDEX_SUFFIX = '.idx'
+INDEX_MAGIC = b'GENIDX01'
+INDEX_HEADER = struct.Struct('=8sQQQQ')
+TRANSACTION_SIZE = 1000000
+CALIBRATION_MIN_WORK = 2000000
+CALIBRATION_WORK = 100000
+CALIBRATION_REPEAT = 3
+CHECKPOINT_SUFFIX = '.ckpt'
+CHECKPOINT_KEYS = ('data_num', 'seed', 'type', 'engine', 'distribution', 'mean', 'std',
+                   'min_value', 'max_value', 'length', 'charset', 'checkpoint_every',
+                   'index', 'index_stride', 'length_dist', 'length_min', 'length_max',
+                   'length_mean', 'length_std', 'length_weights')
 
-def argparser() -> dict:
-    """Parses command-line options and arguments and returns them as a dictioanary
+
+def length_weights(text: str) -> list:
+    """Parses an empirical length distribution of the form LEN:WEIGHT,LEN:WEIGHT
+
+    Parameters
+    ----------
+    text : str
+        Comma-separated pairs of a length and its weight
 
     Returns
     -------
-    dict
-        a dict of parsed command-line arguments and options
+    list
+        a list of (length, weight) pairs
+    """
+    try:
+        pairs = [(int(length), float(weight))
+                 for length, weight in (item.split(':') for item in text.split(','))]
+    except ValueError:
+        raise argparse.ArgumentTypeError(f'invalid length weights: {text}')
+    if any(length < 0 or weight < 0 for length, weight in pairs) or sum(w for _, w in pairs) <= 0:
+        raise argparse.ArgumentTypeError(
+            'lengths and weights must not be negative and some weight must be positive')
+    return pairs
+
+
+def make_parser() -> argparse.ArgumentParser:
+    """Returns the parser of command-line options and arguments
+
+    Returns
+    -------
+    argparse.ArgumentParser
+        the command-line parser
     """
     parser = argparse.ArgumentParser(
         description='Generate some random strings or integers.', prog='GEN', usage='%(prog)s [options]')
-    parser.add_argument('data_num', type=int,
-                        help='number of strings or integers to generate')
+    parser.add_argument('data_num', type=int, nargs='?',
+                        help='number of strings or integers to generate (not used with --follow)')
     parser.add_argument('-s', '--seed', type=int,
-                        default=0,
                         help='initial seed value (default: 0)')
     parser.add_argument('-t', '--type',
                         choices=['int', 'float', 'str'],
@@ -48,6 +173,19 @@ def argparser() -> dict:
     parser.add_argument('--timeit',
                         action='store_true',
                         help='print execution time')
+    parser.add_argument('--engine',
+                        choices=['auto', 'classic', 'bulk', 'numpy'],
+                        help='generation engine; auto picks the fastest one from cached '
+                             'calibration runs, or bulk when --seed is given (default: classic)')
+    parser.add_argument('--secure',
+                        action='store_true',
+                        help='draw data from the operating system cryptographic random source')
+    parser.add_argument('--follow',
+                        action='store_true',
+                        help='generate data until interrupted')
+    parser.add_argument('--rate', type=float,
+                        metavar='ROWS_PER_SEC',
+                        help='limit output to ROWS_PER_SEC rows per second')
     group1 = parser.add_argument_group(
         'floats', 'parameters only for float numbers')
     group1.add_argument('-d', '--distribution',
@@ -69,30 +207,239 @@ def argparser() -> dict:
     group2.add_argument('-c', '--charset',
                         default=string.ascii_letters + string.digits + string.punctuation,
                         help='acceptable character set (default: all letters, digits and punctuation marks)')
+    group2.add_argument('--length-dist',
+                        choices=['fixed', 'uniform', 'normal', 'empirical'],
+                        default='fixed',
+                        help='distribution of string lengths (default: fixed, every string has --length characters)')
+    group2.add_argument('--length-min', type=int,
+                        help='uniform length distribution min length')
+    group2.add_argument('--length-max', type=int,
+                        help='uniform length distribution max length')
+    group2.add_argument('--length-mean', type=float,
+                        help='normal length distribution mean (default: --length)')
+    group2.add_argument('--length-std', type=float,
+                        help='normal length distribution standard deviation (greater than zero)')
+    group2.add_argument('--length-weights', type=length_weights,
+                        metavar='LEN:WEIGHT,...',
+                        help='empirical length distribution, e.g. 3:1,8:2.5')
+    group2.add_argument('--unique',
+                        action='store_true',
+                        help='generate only distinct strings')
+    group3 = parser.add_argument_group(
+        'file sampling', 'draw random lines of an existing file instead of generating data')
+    group3.add_argument('--from-file', metavar='PATH',
+                        help='file to draw lines from (line index is cached in PATH.idx)')
+    group3.add_argument('--replace',
+                        action='store_true',
+                        help='draw lines with replacement')
+    group4 = parser.add_argument_group(
+        'sqlite', 'load data straight into a SQLite database')
+    group4.add_argument('--sqlite', metavar='DB',
+                        help='database file to insert the data into')
+    group4.add_argument('--table', metavar='NAME',
+                        default='data',
+                        help='table name, created if it does not exist (default: data)')
+    group4.add_argument('--journal-mode',
+                        choices=['DELETE', 'TRUNCATE', 'PERSIST', 'MEMORY', 'WAL', 'OFF'],
+                        default='OFF',
+                        help='journal_mode pragma during the load (default: OFF)')
+    group4.add_argument('--synchronous',
+                        choices=['OFF', 'NORMAL', 'FULL', 'EXTRA'],
+                        default='OFF',
+                        help='synchronous pragma during the load (default: OFF)')
+    group4.add_argument('--cache-size', type=int,
+                        default=262144,
+                        help='page cache size in KiB (default: 262144)')
+    group5 = parser.add_argument_group(
+        'profiling', 'profile generation and writing of the data')
+    group5.add_argument('--profile', metavar='PATH',
+                        help='save pstats data to PATH and collapsed stacks to PATH.collapsed')
+    group5.add_argument('--profile-mode',
+                        choices=['deterministic', 'sampling'],
+                        default='deterministic',
+                        help='cProfile, or low-overhead stack sampling that saves only '
+                             'collapsed stacks (default: deterministic)')
+    group5.add_argument('--profile-interval', type=float,
+                        default=0.005,
+                        help='sampling interval in seconds (default: 0.005)')
+    group6 = parser.add_argument_group(
+        'checkpoints', 'resume long runs writing to a file')
+    group6.add_argument('--checkpoint-every', type=int, metavar='ROWS',
+                        help='flush the output and save a checkpoint every ROWS rows')
+    group6.add_argument('--resume',
+                        action='store_true',
+                        help='continue from the last checkpoint, if there is one')
+    group7 = parser.add_argument_group(
+        'row index', 'write a row offset index next to the output file')
+    group7.add_argument('--index',
+                        action='store_true',
+                        help='write offsets of the rows to FILENAME.idx')
+    group7.add_argument('--index-stride', type=int, metavar='K',
+                        default=1,
+                        help='index every K-th row (default: 1)')
     parser.add_argument('-f', '--filename', type=str,
                         default='',
                         help='output file name (default: output to console)')
+    parser.add_argument('--jobs', metavar='SPEC',
+                        help='run the datasets listed in a JSON or TOML file')
+    parser.add_argument('--workers', type=int,
+                        default=os.cpu_count() or 1,
+                        help='number of worker processes for --jobs (default: number of CPUs)')
+    return parser
+
+
+def argparser(argv: list = None) -> dict:
+    """Parses command-line options and arguments and returns them as a dictioanary
+
+    Parameters
+    ----------
+    argv : list
+        Arguments to parse (default: command-line arguments)
 
-    args = parser.parse_args()
+    Returns
+    -------
+    dict
+        a dict of parsed command-line arguments and options
+    """
+    parser = make_parser()
+    args = parser.parse_args(argv)
 
+    if args.jobs is not None:
+        # the options of each dataset come from its definition in the jobs file
+        given = [action.option_strings[-1] if action.option_strings else action.dest
+                 for action in parser._actions
+                 if action.dest not in ('help', 'jobs', 'workers')
+                 and getattr(args, action.dest) != action.default]
+        if given:
+            sys.exit(f"GEN: error: {', '.join(given)} cannot be used with --jobs, "
+                     f"set them in the dataset definitions")
+        if args.workers <= 0:
+            sys.exit("GEN: error: number of workers must be greater than zero")
+        return args
+    if args.follow and args.data_num is not None:
+        sys.exit("GEN: error: data_num cannot be used with --follow")
+    if not args.follow and args.data_num is None:
+        sys.exit("GEN: error: data_num must be specified")
+    if args.rate is not None and args.rate <= 0:
+        sys.exit("GEN: error: rate must be greater than zero")
     if args.type == 'float':
-        if args.distribution == None:
-            sys.exit("GEN: error: distribution must be specified")
-        if args.distribution == 'uniform':
-            if args.min_value == None or args.max_value == None:
-                sys.exit("GEN: error: min value and max value must be specified")
-            if args.max_value < args.min_value:
-                sys.exit(
-                    "GEN: error: max value must be greater or equal to min_value")
-        if args.distribution == 'normal':
-            if args.mean == None or args.std == None:
-                sys.exit(
-                    "GEN: error: mean value and standard deviation must be specified")
-            if args.std <= 0:
-                sys.exit('GEN: error: std must be greater than zero')
+        check_float_args(args)
+    if args.length_dist != 'fixed':
+        check_length_args(args)
+    if args.from_file is not None:
+        if not os.path.isfile(args.from_file):
+            sys.exit(f"GEN: error: file {args.from_file} does not exist")
+        if args.unique:
+            sys.exit("GEN: error: --unique cannot be used with --from-file")
+        if args.data_num is None and not args.replace:
+            sys.exit("GEN: error: --follow with --from-file requires --replace")
+    if args.sqlite is not None:
+        if args.filename != '':
+            sys.exit("GEN: error: --sqlite cannot be used with --filename")
+        if args.rate is not None:
+            sys.exit("GEN: error: --rate cannot be used with --sqlite")
+        if args.table == '':
+            sys.exit("GEN: error: table name must not be empty")
+        if args.cache_size <= 0:
+            sys.exit("GEN: error: cache size must be greater than zero")
+    # the engine is reported by --timeit only when it was chosen explicitly
+    args.engine_given = args.engine is not None or args.secure
+    if args.secure:
+        if args.seed is not None:
+            sys.exit("GEN: error: --seed cannot be used with --secure")
+        if args.engine is not None:
+            sys.exit("GEN: error: --engine cannot be used with --secure")
+        if args.unique or args.from_file is not None:
+            sys.exit("GEN: error: --secure cannot be used with --unique or --from-file")
+        args.engine = 'secure'
+    elif args.engine is None:
+        args.engine = 'classic'
+    if args.index:
+        if args.filename == '':
+            sys.exit("GEN: error: --index requires --filename")
+        if args.index_stride <= 0:
+            sys.exit("GEN: error: index stride must be greater than zero")
+    if args.resume and args.checkpoint_every is None:
+        sys.exit("GEN: error: --resume requires --checkpoint-every")
+    if args.checkpoint_every is not None:
+        if args.checkpoint_every <= 0:
+            sys.exit("GEN: error: checkpoint interval must be greater than zero")
+        if args.filename == '' or args.data_num is None:
+            sys.exit("GEN: error: --checkpoint-every requires data_num and --filename")
+        if (args.rate is not None or args.sqlite is not None or args.unique
+                or args.from_file is not None or args.secure):
+            sys.exit("GEN: error: --checkpoint-every cannot be used with --rate, --sqlite, "
+                     "--unique, --from-file or --secure")
+    if args.engine == 'numpy':
+        if importlib.util.find_spec('numpy') is None:
+            sys.exit("GEN: error: engine numpy requires numpy to be installed")
+        if args.type not in ENGINES['numpy']:
+            sys.exit(f"GEN: error: engine numpy does not support type {args.type}")
+    if args.profile_interval <= 0:
+        sys.exit("GEN: error: profile interval must be greater than zero")
+    if args.unique:
+        if args.type != 'str':
+            sys.exit("GEN: error: --unique can be used only with strings")
+        if args.data_num is None:
+            sys.exit("GEN: error: --unique cannot be used with --follow")
+        space = len(set(args.charset)) ** args.length
+        if args.data_num > space // 2:
+            sys.exit(f"GEN: error: charset and length allow only {space} distinct strings, "
+                     f"too few for {args.data_num} unique strings")
     return args
 
 
+def check_float_args(args):
+    """Exits with an error if float distribution parameters are inconsistent
+
+    Parameters
+    ----------
+    args
+        Parsed command-line arguments
+    """
+    if args.distribution == None:
+        sys.exit("GEN: error: distribution must be specified")
+    if args.distribution == 'uniform':
+        if args.min_value == None or args.max_value == None:
+            sys.exit("GEN: error: min value and max value must be specified")
+        if args.max_value < args.min_value:
+            sys.exit(
+                "GEN: error: max value must be greater or equal to min_value")
+    if args.distribution == 'normal':
+        if args.mean == None or args.std == None:
+            sys.exit(
+                "GEN: error: mean value and standard deviation must be specified")
+        if args.std <= 0:
+            sys.exit('GEN: error: std must be greater than zero')
+
+
+def check_length_args(args):
+    """Exits with an error if string length distribution parameters are inconsistent
+
+    Parameters
+    ----------
+    args
+        Parsed command-line arguments
+    """
+    if args.type != 'str':
+        sys.exit("GEN: error: --length-dist can be used only with strings")
+    if args.unique:
+        sys.exit("GEN: error: --length-dist cannot be used with --unique")
+    if args.length_dist == 'uniform':
+        if args.length_min is None or args.length_max is None:
+            sys.exit("GEN: error: length min and length max must be specified")
+        if not 0 <= args.length_min <= args.length_max:
+            sys.exit("GEN: error: length max must be greater or equal to length min, "
+                     "and length min must not be negative")
+    if args.length_dist == 'normal':
+        if args.length_std is None or args.length_std <= 0:
+            sys.exit("GEN: error: length std must be specified and greater than zero")
+        if args.length_mean is None:
+            args.length_mean = args.length
+    if args.length_dist == 'empirical' and args.length_weights is None:
+        sys.exit("GEN: error: length weights must be specified")
+
+
 def gen_str(data_num: int, charset: str, length: int) -> str:
     """Returns random generated strings
 
@@ -168,36 +515,2171 @@ def gen_float(data_num: int, distribution: str, min_value: float, max_value: flo
     return res
 
 
-def main():
-    args = argparser()
-    random.seed(a=args.seed)
+def gen_str_bulk(data_num: int, charset: str, length: int) -> str:
+    """Returns random generated strings, drawing all characters at once
 
-    alg = 0.0
-    if args.type == 'str':
-        start = time.process_time()
-        result = gen_str(args.data_num, args.charset, args.length)
-        end = time.process_time()
-        alg = end - start
-    elif args.type == 'int':
-        start = time.process_time()
-        result = gen_int(args.data_num)
-        end = time.process_time()
-        alg = end - start
-    elif args.type == 'float':
-        start = time.process_time()
-        result = gen_float(args.data_num, args.distribution,
-                           args.min_value, args.max_value, args.mean, args.std)
-        end = time.process_time()
-        alg = end - start
+    Parameters
+    ----------
+    data_num : int
+        The number of strings to generate
+    charset : str
+        Acceptable character set
+    length : int
+        Length of the generated strings
 
-    if args.filename != '':
-        with open(args.filename, "w") as f:
-            f.write(result)
+    Returns
+    -------
+    str
+        a string of randomly generated strings
+    """
+    return _split_rows(''.join(random.choices(charset, k=data_num * length)), data_num, length)
+
+
+def _split_rows(chars: str, data_num: int, length: int) -> str:
+    """Returns chars cut into data_num newline-terminated rows of equal length"""
+    if length == 0:
+        return '\n' * data_num
+    return ''.join([chars[i:i + length] + '\n' for i in range(0, len(chars), length)])
+
+
+def gen_int_bulk(data_num: int) -> str:
+    """Returns random generated integer numbers, drawing all bits at once
+
+    Parameters
+    ----------
+    data_num : int
+        The number of integer numbers to generate
+
+    Returns
+    -------
+    str
+        a string of randomly generated integer numbers
+    """
+    values = array('q', random.randbytes(8 * data_num))
+    if sys.byteorder == 'big':
+        values.byteswap()
+    return ''.join([f'{x}\n' for x in values])
+
+
+def gen_float_bulk(data_num: int, distribution: str, min_value: float, max_value: float, mean: float, std: float) -> str:
+    """Returns random generated float numbers, formatted all at once
+
+    Parameters
+    ----------
+    data_num : int
+        The number of float numbers to generate
+    distribution : str
+        Distribution type (uniform or normal)
+    min_value : float
+        Uniform distribution min value
+    max_value : float
+        Uniform distribution max value
+    mean : float
+        normal distribution mean
+    std : float
+        Normal distribution standard deviation
+
+    Returns
+    -------
+    str
+        a string of randomly generated float numbers
+    """
+    if distribution == 'uniform':
+        uniform = random.uniform
+        return ''.join([f'{uniform(min_value, max_value)}\n' for _ in range(data_num)])
+    normalvariate = random.normalvariate
+    return ''.join([f'{normalvariate(mean, std)}\n' for _ in range(data_num)])
+
+
+def gen_int_numpy(data_num: int) -> str:
+    """Returns random generated integer numbers using numpy
+
+    The numpy generator is seeded from the random module, so the output
+    depends only on the seed.
+
+    Parameters
+    ----------
+    data_num : int
+        The number of integer numbers to generate
+
+    Returns
+    -------
+    str
+        a string of randomly generated integer numbers
+    """
+    import numpy as np  # optional dependency, imported only when used
+
+    rng = np.random.default_rng(random.getrandbits(64))
+    values = rng.integers(-sys.maxsize - 1, sys.maxsize, size=data_num,
+                          dtype=np.int64, endpoint=True)
+    return ''.join([f'{x}\n' for x in values.tolist()])
+
+
+def gen_float_numpy(data_num: int, distribution: str, min_value: float, max_value: float, mean: float, std: float) -> str:
+    """Returns random generated float numbers using numpy
+
+    The numpy generator is seeded from the random module, so the output
+    depends only on the seed.
+
+    Parameters
+    ----------
+    data_num : int
+        The number of float numbers to generate
+    distribution : str
+        Distribution type (uniform or normal)
+    min_value : float
+        Uniform distribution min value
+    max_value : float
+        Uniform distribution max value
+    mean : float
+        normal distribution mean
+    std : float
+        Normal distribution standard deviation
+
+    Returns
+    -------
+    str
+        a string of randomly generated float numbers
+    """
+    import numpy as np  # optional dependency, imported only when used
+
+    rng = np.random.default_rng(random.getrandbits(64))
+    if distribution == 'uniform':
+        values = rng.uniform(min_value, max_value, size=data_num)
     else:
-        print(f'Generated data:\n{result}')
+        values = rng.normal(mean, std, size=data_num)
+    return ''.join([f'{x}\n' for x in values.tolist()])
+
+
+@functools.lru_cache(maxsize=None)
+def _byte_tables(m: int) -> tuple:
+    """Returns the rejection limit and bytes.translate tables mapping bytes onto range(m)"""
+    limit = 256 - 256 % m
+    return limit, bytes(b % m for b in range(256)), bytes(range(limit, 256))
+
+
+@functools.lru_cache(maxsize=None)
+def _charset_table(charset: str) -> bytes:
+    """Returns the bytes.translate table mapping indices onto a latin-1 charset, or None"""
+    if len(charset) > 256 or max(charset, default='\0') > '\xff':
+        return None
+    return charset.encode('latin-1').ljust(256, b'\0')
+
+
+def secure_indices(k: int, m: int):
+    """Returns k cryptographically secure random integers from range(m)
+
+    Random bytes are drawn from os.urandom in batches, and values that
+    would make the modulo biased are rejected, so every integer has the
+    same probability. For m up to 256 single bytes are used and rejection
+    and the modulo are done by bytes.translate.
+
+    Parameters
+    ----------
+    k : int
+        Number of integers to draw
+    m : int
+        Size of the range
+
+    Returns
+    -------
+    bytes or list
+        the drawn integers (bytes if m is at most 256)
+    """
+    if m <= 256:
+        limit, modulo, rejected = _byte_tables(m)
+        res = b''
+        while len(res) < k:
+            need = k - len(res)
+            res += os.urandom(need * 256 // limit + 64).translate(modulo, rejected)
+        return res[:k]
+    limit = (1 << 32) - (1 << 32) % m
+    res = []
+    while len(res) < k:
+        need = k - len(res)
+        words = array('I', os.urandom(4 * (need * (1 << 32) // limit + 64)))
+        res.extend(w % m for w in words if w < limit)
+    return res[:k]
+
+
+def _secure_units(n: int) -> list:
+    """Returns n cryptographically secure random floats from [0, 1)"""
+    return [(w >> 11) * 2 ** -53 for w in array('Q', os.urandom(8 * n))]
+
+
+def gen_str_secure(data_num: int, charset: str, length: int) -> str:
+    """Returns cryptographically secure random strings
+
+    Parameters
+    ----------
+    data_num : int
+        The number of strings to generate
+    charset : str
+        Acceptable character set
+    length : int
+        Length of the generated strings
+
+    Returns
+    -------
+    str
+        a string of randomly generated strings
+    """
+    return _split_rows(secure_chars(data_num * length, charset), data_num, length)
+
+
+def secure_chars(k: int, charset: str) -> str:
+    """Returns a string of k cryptographically secure random characters from charset"""
+    indices = secure_indices(k, len(charset))
+    table = _charset_table(charset)
+    if table is not None:
+        return indices.translate(table).decode('latin-1')
+    return ''.join([charset[i] for i in indices])
+
+
+def gen_int_secure(data_num: int) -> str:
+    """Returns cryptographically secure random integer numbers
+
+    Parameters
+    ----------
+    data_num : int
+        The number of integer numbers to generate
+
+    Returns
+    -------
+    str
+        a string of randomly generated integer numbers
+    """
+    return ''.join([f'{x}\n' for x in array('q', os.urandom(8 * data_num))])
+
+
+def gen_float_secure(data_num: int, distribution: str, min_value: float, max_value: float, mean: float, std: float) -> str:
+    """Returns cryptographically secure random float numbers
+
+    Normal numbers are produced by the Box-Muller transform.
+
+    Parameters
+    ----------
+    data_num : int
+        The number of float numbers to generate
+    distribution : str
+        Distribution type (uniform or normal)
+    min_value : float
+        Uniform distribution min value
+    max_value : float
+        Uniform distribution max value
+    mean : float
+        normal distribution mean
+    std : float
+        Normal distribution standard deviation
+
+    Returns
+    -------
+    str
+        a string of randomly generated float numbers
+    """
+    if distribution == 'uniform':
+        width = max_value - min_value
+        return ''.join([f'{min_value + width * u}\n' for u in _secure_units(data_num)])
+    units = _secure_units(data_num + data_num % 2)
+    res = []
+    for u1, u2 in zip(units[::2], units[1::2]):
+        r = std * math.sqrt(-2 * math.log(1 - u1))
+        res.append(f'{mean + r * math.cos(2 * math.pi * u2)}\n')
+        res.append(f'{mean + r * math.sin(2 * math.pi * u2)}\n')
+    return ''.join(res[:data_num])
+
+
+def draw_lengths(args, data_num: int, rng=random) -> list:
+    """Returns data_num string lengths drawn from the distribution selected in args
+
+    Parameters
+    ----------
+    args
+        Parsed command-line arguments (see argparser)
+    data_num : int
+        The number of lengths to draw
+    rng
+        Source of randomness with the random module interface
+
+    Returns
+    -------
+    list
+        a list of non-negative lengths
+    """
+    if args.length_dist == 'uniform':
+        return rng.choices(range(args.length_min, args.length_max + 1), k=data_num)
+    if args.length_dist == 'normal':
+        normalvariate = rng.normalvariate
+        mean, std = args.length_mean, args.length_std
+        return [max(0, round(normalvariate(mean, std))) for _ in range(data_num)]
+    if args.length_dist == 'empirical':
+        lengths, weights = zip(*args.length_weights)
+        return rng.choices(lengths, weights, k=data_num)
+    return [args.length] * data_num
+
+
+def gen_str_lengths(lengths: list, charset: str, secure: bool = False) -> str:
+    """Returns random generated strings of the given lengths
+
+    All characters of the batch are drawn into a single buffer, which is
+    then cut by the lengths, so the cost is proportional to the number of
+    generated characters.
+
+    Parameters
+    ----------
+    lengths : list
+        Length of every string
+    charset : str
+        Acceptable character set
+    secure : bool
+        Draw characters from the operating system cryptographic source
+
+    Returns
+    -------
+    str
+        a string of randomly generated strings
+    """
+    total = sum(lengths)
+    if secure:
+        chars = secure_chars(total, charset)
+    else:
+        chars = ''.join(random.choices(charset, k=total))
+    return ''.join([chars[start:end] + '\n' for start, end in
+                    zip(itertools.accumulate(lengths, initial=0), itertools.accumulate(lengths))])
+
+
+class BloomFilter:
+    """Set membership filter with no false negatives and a bounded rate of false positives
+
+    Attributes
+    ----------
+    size : int
+        Number of bits
+    hashes : int
+        Number of bits set per item
+    bits : bytearray
+        The bit array
+    rejected : int
+        Number of items reported as already added
+    """
+
+    def __init__(self, capacity: int, error_rate: float = BLOOM_ERROR_RATE):
+        capacity = max(capacity, 1)
+        self.size = max(8, math.ceil(-capacity * math.log(error_rate) / math.log(2) ** 2))
+        self.hashes = max(1, round(self.size / capacity * math.log(2)))
+        self.bits = bytearray((self.size + 7) // 8)
+        self.rejected = 0
+        import hashlib  # imported only with --unique
+        self._blake2b = hashlib.blake2b
+
+    def _hash(self, item: str) -> tuple:
+        """Returns two 64-bit hashes of item that are stable across processes"""
+        digest = self._blake2b(item.encode(), digest_size=16).digest()
+        return int.from_bytes(digest[:8], 'little'), int.from_bytes(digest[8:], 'little') | 1
+
+    def _positions(self, item):
+        """Yields bit positions of item using double hashing"""
+        h1, h2 = self._hash(item)
+        for i in range(self.hashes):
+            yield (h1 + i * h2) % self.size
+
+    def __contains__(self, item) -> bool:
+        bits = self.bits
+        return all(bits[pos >> 3] & (1 << (pos & 7)) for pos in self._positions(item))
+
+    def add(self, item) -> bool:
+        """Adds item and returns False if it was probably added before"""
+        h1, h2 = self._hash(item)
+        bits = self.bits
+        new = False
+        for i in range(self.hashes):
+            pos = (h1 + i * h2) % self.size
+            mask = 1 << (pos & 7)
+            if not bits[pos >> 3] & mask:
+                bits[pos >> 3] |= mask
+                new = True
+        if not new:
+            self.rejected += 1
+        return new
+
+
+def gen_str_unique(data_num: int, charset: str, length: int, seen: BloomFilter) -> str:
+    """Returns random generated strings not added to seen before
+
+    Parameters
+    ----------
+    data_num : int
+        The number of strings to generate
+    charset : str
+        Acceptable character set
+    length : int
+        Length of the generated strings
+    seen : BloomFilter
+        Filter of already generated strings, updated in place
+
+    Returns
+    -------
+    str
+        a string of randomly generated strings
+    """
+    res = []
+    while len(res) < data_num:
+        # candidates for all missing rows are cut from one buffer
+        buf = ''.join(random.choices(charset, k=(data_num - len(res)) * length))
+        for i in range(0, len(buf), length):
+            row = buf[i:i + length]
+            if seen.add(row):
+                res.append(row + '\n')
+    return ''.join(res)
+
+
+def count_distinct(lines, run_size: int = RUN_SIZE, fan_in: int = MERGE_FAN_IN) -> int:
+    """Returns the exact number of distinct lines using an external sort-merge
+
+    Lines are sorted in runs of run_size and runs are spilled to temporary
+    files, so memory use is bounded by one run. Every fan_in runs of a
+    level are merged into one run of the next level, and the remaining
+    runs are merged at most fan_in at a time, so the number of open files
+    stays well below the usual limit however many lines there are.
+
+    Parameters
+    ----------
+    lines
+        An iterable of lines, e.g. a text file
+    run_size : int
+        Maximum number of lines sorted in memory at once
+    fan_in : int
+        Maximum number of runs merged at once
+
+    Returns
+    -------
+    int
+        the number of distinct lines
+    """
+    import tempfile  # imported only with --unique
+    spilled = []
+
+    def spill(run):
+        tmp = tempfile.TemporaryFile('w+')
+        spilled.append(tmp)
+        tmp.writelines(run)
+        tmp.seek(0)
+        return tmp
+
+    def merge(runs):
+        tmp = spill(line for line, _ in itertools.groupby(heapq.merge(*runs)))
+        for run in runs:
+            run.close()
+        return tmp
+
+    lines = iter(lines)
+    levels = []
+    try:
+        for run in iter(lambda: list(itertools.islice(lines, run_size)), []):
+            run.sort()
+            tmp = spill(run)
+            for level in itertools.count():
+                if level == len(levels):
+                    levels.append([])
+                levels[level].append(tmp)
+                if len(levels[level]) < fan_in:
+                    break
+                tmp = merge(levels[level])
+                levels[level] = []
+        runs = [tmp for level in levels for tmp in level]
+        while len(runs) > fan_in:
+            runs = [merge(runs[:fan_in])] + runs[fan_in:]
+        return sum(1 for _ in itertools.groupby(heapq.merge(*runs)))
+    finally:
+        for tmp in spilled:
+            tmp.close()
+
+
+def _row_ends(block: bytes, base: int, skip: int = 0, stride: int = 1) -> list:
+    """Returns end offsets of rows skip + 1, skip + 1 + stride, ... in block
+
+    Every offset is taken from the row lengths when stride is 1. Otherwise
+    the next picked newline is guessed from the average row length, the
+    newlines before the guess are counted and the guess is corrected with
+    a few find calls, so only the picked rows are visited in Python.
+
+    Parameters
+    ----------
+    block : bytes
+        Newline-terminated rows
+    base : int
+        Offset of the block in the file
+    skip : int
+        Number of rows before the first picked row
+    stride : int
+        Number of rows between picked rows
+
+    Returns
+    -------
+    list
+        offsets following the newline of each picked row
+    """
+    if stride == 1 and skip == 0:
+        return list(map(operator.add, itertools.accumulate(map(len, block.split(b'\n')[:-1])),
+                        itertools.count(base + 1)))
+    total = block.count(b'\n')
+    if total <= skip:
+        return []
+    avg = len(block) / total
+    ends = []
+    pos = 0
+    need = skip + 1
+    for _ in range((total - skip - 1) // stride + 1):
+        # the need-th newline at or after pos
+        while True:
+            guess = min(len(block), pos + int(need * avg) + 1)
+            found = block.count(b'\n', pos, guess)
+            if found >= need:
+                break
+            pos = guess
+            need -= found
+        end = guess
+        if found - need < need:
+            for _ in range(found - need + 1):
+                end = block.rfind(b'\n', pos, end)
+        else:
+            end = pos - 1
+            for _ in range(need):
+                end = block.find(b'\n', end + 1)
+        ends.append(base + end + 1)
+        pos = end + 1
+        need = stride
+    return ends
+
+
+class IndexWriter:
+    """Writes the row offset sidecar of a text file while the file is written
+
+    Offsets of every stride-th row are found in each written block, with
+    numpy when it is installed, and appended to a temporary sidecar, which
+    replaces index_path (default: PATH.idx) when the index is closed after
+    the file. The temporary sidecar gets a unique name unless tmp is
+    given, which lets checkpointed runs reopen it on resume.
+
+    Attributes
+    ----------
+    path : str
+        Indexed file name
+    stride : int
+        Number of rows between indexed offsets
+    rows : int
+        Number of indexed rows
+    size : int
+        Number of indexed bytes
+    entries : int
+        Number of written offsets
+    """
+
+    def __init__(self, path: str, stride: int = 1, rows: int = 0, size: int = 0,
+                 entries: int = None, tmp: str = None, index_path: str = None):
+        self.path = path
+        self.stride = stride
+        self.rows = rows
+        self.size = size
+        self._index_path = index_path or path + INDEX_SUFFIX
+        if tmp is None:
+            import tempfile  # imported only when an index is built
+            fd, self._tmp = tempfile.mkstemp(suffix='.tmp', prefix=os.path.basename(self._index_path) + '.',
+                                             dir=os.path.dirname(os.path.abspath(self._index_path)))
+            self._file = os.fdopen(fd, 'wb')
+        else:
+            self._tmp = tmp
+            self._file = open(tmp, 'wb' if entries is None else 'r+b')
+        if entries is None:
+            self._file.write(INDEX_HEADER.pack(INDEX_MAGIC, 0, 0, 0, 0))
+            self._file.write(array('Q', [0]).tobytes())
+            self.entries = 1
+        else:
+            self._file.truncate(INDEX_HEADER.size + 8 * entries)
+            self._file.seek(0, os.SEEK_END)
+            self.entries = entries
+        self._np = None
+        if importlib.util.find_spec('numpy') is not None:
+            import numpy as np  # optional dependency, imported only when used
+            self._np = np
+
+    def add(self, block: bytes):
+        """Indexes newline-terminated rows written right after the previous ones"""
+        skip = (self.stride - 1 - self.rows) % self.stride
+        if self._np is not None:
+            np = self._np
+            ends = np.flatnonzero(np.frombuffer(block, dtype=np.uint8) == ord('\n'))
+            rows = len(ends)
+            picked = (ends[skip::self.stride] + (self.size + 1)).astype(np.uint64)
+        else:
+            rows = block.count(b'\n')
+            picked = array('Q', _row_ends(block, self.size, skip, self.stride))
+        self._file.write(picked.tobytes())
+        self.entries += len(picked)
+        self.rows += rows
+        self.size += len(block)
+
+    def flush(self):
+        self._file.flush()
+        os.fsync(self._file.fileno())
+
+    def close(self):
+        """Finishes the sidecar; the indexed file must be closed before"""
+        st = os.stat(self.path)
+        if self.rows % self.stride:
+            self._file.write(array('Q', [st.st_size]).tobytes())
+            self.entries += 1
+        elif self.size != st.st_size:
+            # the last row has no newline
+            self._file.seek(-8, os.SEEK_END)
+            self._file.write(array('Q', [st.st_size]).tobytes())
+        self._file.seek(0)
+        self._file.write(INDEX_HEADER.pack(INDEX_MAGIC, st.st_size, st.st_mtime_ns,
+                                           self.stride, self.rows))
+        self._file.close()
+        os.replace(self._tmp, self._index_path)
+
+    def discard(self):
+        """Removes the unfinished sidecar"""
+        self._file.close()
+        os.remove(self._tmp)
+
+
+class IndexedOutput:
+    """Binary file wrapper that accepts text and indexes the written rows"""
+
+    def __init__(self, f, index: IndexWriter):
+        self._file = f
+        self._index = index
+
+    def write(self, text: str):
+        # rows are encoded and indexed about CHUNK_SIZE characters at a
+        # time, so a large text is not copied as a whole
+        start = 0
+        while start < len(text):
+            end = text.find('\n', start + CHUNK_SIZE) + 1 or len(text)
+            data = text[start:end].encode(errors='surrogateescape')
+            self._file.write(data)
+            self._index.add(data)
+            start = end
+
+    def flush(self):
+        self._file.flush()
+
+
+@contextlib.contextmanager
+def open_output(args):
+    """Opens args.filename for writing text, building its row offset index if args.index is set
+
+    Parameters
+    ----------
+    args
+        Parsed command-line arguments (see argparser)
+
+    Yields
+    ------
+    file
+        a writable text stream
+    """
+    if not getattr(args, 'index', False):
+        with open(args.filename, "w", errors='surrogateescape') as f:
+            yield f
+        return
+    index = IndexWriter(args.filename, args.index_stride)
+    try:
+        with open(args.filename, "wb") as f:
+            yield IndexedOutput(f, index)
+    except BaseException:
+        index.discard()
+        raise
+    index.close()
+
+
+def build_line_index(path: str, stride: int = 1, index_path: str = None):
+    """Scans a text file once and writes the offsets of its lines to a sidecar file
+
+    Parameters
+    ----------
+    path : str
+        Text file to index
+    stride : int
+        Number of rows between indexed offsets
+    index_path : str
+        Sidecar file name (default: PATH.idx)
+    """
+    with open(path, 'rb') as f:
+        index = IndexWriter(path, stride, index_path=index_path)
+        try:
+            for block in _blocks(f):
+                index.add(block)
+        except BaseException:
+            index.discard()
+            raise
+    index.close()
+
+
+def cached_index_path(path: str) -> str:
+    """Returns the sidecar file name in the user cache for a file whose directory is not writable"""
+    import hashlib  # imported only for indexes kept in the cache
+    digest = hashlib.sha1(os.path.abspath(path).encode(errors='surrogateescape')).hexdigest()
+    index_dir = os.path.join(_cache_dir(), 'gen', 'index')
+    os.makedirs(index_dir, exist_ok=True)
+    return os.path.join(index_dir, digest + INDEX_SUFFIX)
+
+
+class LineIndex:
+    """Offsets of rows of a text file, kept in a binary sidecar file
+
+    The sidecar starts with a header holding the size and modification
+    time of the indexed file, the stride K and the number of rows. It is
+    followed by native uint64 offsets of every K-th row and the offset of
+    the end of data. The sidecar is memory-mapped, so an open index takes
+    O(1) memory. A missing or stale sidecar, or one with a stride other
+    than the required one, is rebuilt with a single scan. When the
+    sidecar cannot be written next to the file, it is kept in the user
+    cache directory instead (see cached_index_path).
+
+    Attributes
+    ----------
+    rows : int
+        Number of rows in the file
+    stride : int
+        Number of rows between indexed offsets
+    offsets : memoryview
+        Indexed offsets
+    """
+
+    def __init__(self, path: str, stride: int = None):
+        index_path = path + INDEX_SUFFIX
+        fresh = self._fresh(path, index_path)
+        if fresh is None or stride not in (None, fresh):
+            try:
+                build_line_index(path, stride or 1)
+            except OSError:
+                if not os.access(path, os.R_OK):
+                    raise
+                # the directory of the file is not writable
+                index_path = cached_index_path(path)
+                fresh = self._fresh(path, index_path)
+                if fresh is None or stride not in (None, fresh):
+                    build_line_index(path, stride or 1, index_path)
+        self._file = open(index_path, 'rb')
+        self._mm = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        _, _, _, self.stride, self.rows = INDEX_HEADER.unpack_from(self._mm)
+        self.offsets = memoryview(self._mm)[INDEX_HEADER.size:].cast('Q')
+
+    @staticmethod
+    def _fresh(path: str, index_path: str) -> int:
+        """Returns the stride of index_path if it is a valid index of the current contents of path"""
+        try:
+            with open(index_path, 'rb') as f:
+                magic, size, mtime, stride, _ = INDEX_HEADER.unpack(f.read(INDEX_HEADER.size))
+        except (OSError, struct.error):
+            return None
+        st = os.stat(path)
+        if magic == INDEX_MAGIC and size == st.st_size and mtime == st.st_mtime_ns:
+            return stride
+        return None
+
+    def close(self):
+        self.offsets.release()
+        self._mm.close()
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def read_rows(path: str, start: int, stop: int) -> str:
+    """Returns rows [start, stop) of a text file using its row offset sidecar
+
+    At most stride - 1 rows are skipped from the nearest indexed offset,
+    so any range is read without scanning the file.
+
+    Parameters
+    ----------
+    path : str
+        Text file with a row offset sidecar (built if missing)
+    start : int
+        Index of the first row
+    stop : int
+        Index after the last row
+
+    Returns
+    -------
+    str
+        a string of rows
+    """
+    with LineIndex(path) as index:
+        stop = min(stop, index.rows)
+        if start >= stop:
+            return ''
+        with open(path, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            def locate(row):
+                if row == index.rows:
+                    return index.offsets[-1]
+                pos = index.offsets[row // index.stride]
+                for _ in range(row % index.stride):
+                    pos = mm.find(b'\n', pos) + 1
+                return pos
+            return mm[locate(start):locate(stop)].decode()
+
+
+def floyd_sample(population: int, k: int) -> list:
+    """Returns k distinct random integers from range(population) in random order
+
+    Uses Robert Floyd's algorithm, which makes exactly k draws and keeps
+    only the chosen values in memory.
+
+    Parameters
+    ----------
+    population : int
+        Size of the range to draw from
+    k : int
+        Number of integers to draw
+
+    Returns
+    -------
+    list
+        a list of distinct integers
+    """
+    chosen = {}
+    for j in range(population - k, population):
+        t = random.randint(0, j)
+        chosen[j if t in chosen else t] = None
+    res = list(chosen)
+    random.shuffle(res)
+    return res
+
+
+class LineSampler:
+    """Draws random lines of a text file through an mmap and a line index
+
+    Attributes
+    ----------
+    rows : int
+        Number of lines in the file
+    """
+
+    def __init__(self, path: str, data_num: int = None, replace: bool = False):
+        self.index = LineIndex(path, stride=1)
+        self.rows = self.index.rows
+        if self.rows == 0:
+            self.close()
+            raise ValueError(f'file {path} has no lines')
+        if not replace and data_num > self.rows:
+            self.close()
+            raise ValueError(f'file {path} has only {self.rows} lines, '
+                             f'too few to draw {data_num} lines without replacement')
+        self._file = open(path, 'rb')
+        self._mm = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        self._terminated = self._mm[-1:] == b'\n'
+        self._picks = None if replace else iter(floyd_sample(self.rows, data_num))
+
+    def sample(self, data_num: int) -> str:
+        """Returns data_num randomly drawn lines
+
+        Parameters
+        ----------
+        data_num : int
+            The number of lines to draw
+
+        Returns
+        -------
+        str
+            a string of drawn lines
+        """
+        if self._picks is None:
+            picks = [random.randrange(self.rows) for _ in range(data_num)]
+        else:
+            picks = itertools.islice(self._picks, data_num)
+        mm = self._mm
+        off = self.index.offsets
+        res = [mm[off[i]:off[i + 1]] for i in picks]
+        if not self._terminated:
+            res = [line if line.endswith(b'\n') else line + b'\n' for line in res]
+        # undecodable bytes become surrogates that outputs write back unchanged
+        return b''.join(res).decode(errors='surrogateescape')
+
+    def close(self):
+        if hasattr(self, '_mm'):
+            self._mm.close()
+            self._file.close()
+        self.index.close()
+
+
+ENGINES = {
+    'classic': {'str': gen_str, 'int': gen_int, 'float': gen_float},
+    'bulk': {'str': gen_str_bulk, 'int': gen_int_bulk, 'float': gen_float_bulk},
+    'numpy': {'int': gen_int_numpy, 'float': gen_float_numpy},
+    'secure': {'str': gen_str_secure, 'int': gen_int_secure, 'float': gen_float_secure},
+}
+HEAVY_ENGINES = {'numpy'}
+_system_random = random.SystemRandom()
+
+
+def generate(args, data_num: int) -> str:
+    """Returns data_num rows of the data type selected in args
+
+    Parameters
+    ----------
+    args
+        Parsed command-line arguments (see argparser)
+    data_num : int
+        The number of rows to generate
+
+    Returns
+    -------
+    str
+        a string of randomly generated rows
+    """
+    if getattr(args, 'sampler', None) is not None:
+        return args.sampler.sample(data_num)
+    engine = ENGINES[getattr(args, 'engine', 'classic')]
+    if args.type == 'str':
+        if getattr(args, 'unique', False):
+            return gen_str_unique(data_num, args.charset, args.length, args.seen)
+        if getattr(args, 'length_dist', 'fixed') != 'fixed':
+            secure = args.engine == 'secure'
+            lengths = draw_lengths(args, data_num, _system_random if secure else random)
+            return gen_str_lengths(lengths, args.charset, secure)
+        return engine['str'](data_num, args.charset, args.length)
+    if args.type == 'int':
+        return engine['int'](data_num)
+    return engine['float'](data_num, args.distribution,
+                           args.min_value, args.max_value, args.mean, args.std)
+
+
+def _cache_dir() -> str:
+    """Returns the user cache directory"""
+    return os.environ.get('XDG_CACHE_HOME') or os.path.join(os.path.expanduser('~'), '.cache')
+
+
+def engine_cache_path() -> str:
+    """Returns the per-host file name of the engine calibration cache"""
+    import platform  # imported only with --engine auto
+    return os.path.join(_cache_dir(), 'gen', f'engines-{platform.node()}-py{sys.version_info[0]}{sys.version_info[1]}.json')
+
+
+def _engine_class(args) -> str:
+    """Returns the calibration class of the job parameters"""
+    if args.type == 'str':
+        return (f'str-len{int(math.log2(args.length + 1))}'
+                f'-charset{int(math.log2(len(args.charset) + 1))}')
+    if args.type == 'float':
+        return f'float-{args.distribution}'
+    return 'int'
+
+
+def calibrate(args, engines: list) -> dict:
+    """Measures the throughput of engines on a short run with the job parameters
+
+    The state of the random module is restored afterwards, so calibration
+    does not change the generated data.
+
+    Parameters
+    ----------
+    args
+        Parsed command-line arguments (see argparser)
+    engines : list
+        Names of the engines to measure
+
+    Returns
+    -------
+    dict
+        a dict mapping engine names to generated rows per second
+    """
+    rows = max(1, CALIBRATION_WORK // (args.length + 1 if args.type == 'str' else 1))
+    state = random.getstate()
+    res = {}
+    try:
+        for name in engines:
+            job = argparse.Namespace(**vars(args))
+            job.engine = name
+            best = math.inf
+            for _ in range(CALIBRATION_REPEAT):
+                start = time.perf_counter()
+                generate(job, rows)
+                best = min(best, time.perf_counter() - start)
+            res[name] = rows / max(best, 1e-9)
+    finally:
+        random.setstate(state)
+    return res
+
+
+def _engine_used(args) -> bool:
+    """Returns False if generate ignores the engine for the job parameters"""
+    return not (getattr(args, 'unique', False) or getattr(args, 'from_file', None) is not None
+                or getattr(args, 'length_dist', 'fixed') != 'fixed')
+
+
+def select_engine(args, cache_path: str = None) -> str:
+    """Returns the fastest engine that supports the job parameters
+
+    Jobs for which generate ignores the engine (unique strings, lines from
+    a file and variable-length strings) get the classic engine. Classic
+    and bulk engines produce different data for the same seed, so jobs
+    with an explicit seed, and jobs smaller than CALIBRATION_MIN_WORK rows
+    (characters for strings), use the bulk engine without calibration or
+    heavy imports. Otherwise the engines are calibrated once per parameter
+    class and the results are kept in a per-host cache file.
+
+    Parameters
+    ----------
+    args
+        Parsed command-line arguments (see argparser)
+    cache_path : str
+        Calibration cache file name (default: engine_cache_path())
+
+    Returns
+    -------
+    str
+        the engine name
+    """
+    if not _engine_used(args):
+        return 'classic'
+    work = math.inf if args.data_num is None else args.data_num
+    if args.type == 'str':
+        work *= args.length
+    if work < CALIBRATION_MIN_WORK or getattr(args, 'seed', None) is not None:
+        return 'bulk'
+
+    candidates = [name for name, funcs in ENGINES.items()
+                  if args.type in funcs and name != 'secure'
+                  and (name not in HEAVY_ENGINES or importlib.util.find_spec(name) is not None)]
+    cache_path = cache_path or engine_cache_path()
+    try:
+        with open(cache_path) as f:
+            cache = json.load(f)
+    except (OSError, ValueError):
+        cache = {}
+    key = _engine_class(args)
+    timings = cache.get(key, {})
+    missing = [name for name in candidates if name not in timings]
+    if missing:
+        timings.update(calibrate(args, missing))
+        cache[key] = timings
+        try:
+            os.makedirs(os.path.dirname(cache_path), exist_ok=True)
+            with open(cache_path, 'w') as f:
+                json.dump(cache, f, indent=1)
+        except OSError:
+            pass
+    return max(candidates, key=lambda name: timings[name])
+
+
+def stream(args, out, data_num: int = None, rate: float = None) -> tuple:
+    """Writes generated rows to out batch by batch
+
+    Without rate the rows are written as fast as possible. With rate the
+    batches are paced on a monotonic clock: every batch is due at the time
+    its last row is scheduled, the loop sleeps until then, and the batch
+    size grows whenever generation falls behind the schedule, so the
+    average rate holds without busy-waiting. Once the loop is ahead of the
+    schedule again the batch shrinks back towards rate * TICK rows, so a
+    single stall does not leave the output bursty.
+
+    Parameters
+    ----------
+    args
+        Parsed command-line arguments (see argparser)
+    out
+        A writable text stream
+    data_num : int
+        The number of rows to write (default: until interrupted)
+    rate : float
+        Target rate in rows per second (default: unlimited)
+
+    Returns
+    -------
+    tuple
+        the number of written rows and elapsed wall time in seconds
+    """
+    tick = BATCH_SIZE if rate is None else max(1, int(rate * TICK))
+    batch = tick
+    done = 0
+    start = began = time.monotonic()
+    try:
+        while data_num is None or done < data_num:
+            n = batch if data_num is None else min(batch, data_num - done)
+            out.write(generate(args, n))
+            done += n
+            if rate is None:
+                continue
+            delay = start + done / rate - time.monotonic()
+            if delay > 0:
+                batch = max(tick, batch // 2)
+                time.sleep(delay)
+                continue
+            if delay < -1:
+                # too far behind to catch up, restart the schedule
+                start = time.monotonic() - done / rate
+            if batch < MAX_BATCH_SIZE:
+                batch *= 2
+        out.flush()
+    except (KeyboardInterrupt, BrokenPipeError):
+        pass
+    return done, time.monotonic() - began
+
+
+def connect_sqlite(path: str, journal_mode: str, synchronous: str, cache_size: int) -> 'sqlite3.Connection':
+    """Opens a SQLite database in autocommit mode with loading pragmas set
+
+    Parameters
+    ----------
+    path : str
+        Database file name
+    journal_mode : str
+        Value of the journal_mode pragma
+    synchronous : str
+        Value of the synchronous pragma
+    cache_size : int
+        Page cache size in KiB
+
+    Returns
+    -------
+    sqlite3.Connection
+        an open connection
+    """
+    import sqlite3  # imported only with --sqlite
+    conn = sqlite3.connect(path, isolation_level=None)
+    conn.execute(f'PRAGMA journal_mode = {journal_mode}')
+    conn.execute(f'PRAGMA synchronous = {synchronous}')
+    conn.execute(f'PRAGMA cache_size = {-int(cache_size)}')
+    conn.execute('PRAGMA temp_store = MEMORY')
+    return conn
+
+
+def load_sqlite(args, conn: 'sqlite3.Connection', data_num: int = None) -> int:
+    """Creates the table and inserts generated rows into it batch by batch
+
+    Every batch is inserted with a single executemany, and up to
+    TRANSACTION_SIZE rows are committed in one transaction. Rows are
+    passed as text and converted by the column type affinity inside
+    SQLite, so they match the text output exactly.
+
+    Parameters
+    ----------
+    args
+        Parsed command-line arguments (see argparser)
+    conn : sqlite3.Connection
+        Connection in autocommit mode (see connect_sqlite)
+    data_num : int
+        The number of rows to insert (default: until interrupted)
+
+    Returns
+    -------
+    int
+        the number of inserted rows, counted by SQLite so that a batch
+        committed on interrupt is included
+    """
+    column = {'int': 'INTEGER', 'float': 'REAL', 'str': 'TEXT'}[args.type]
+    if getattr(args, 'sampler', None) is not None:
+        column = 'TEXT'
+    table = '"' + args.table.replace('"', '""') + '"'
+    conn.execute(f'CREATE TABLE IF NOT EXISTS {table} (value {column})')
+    insert = f'INSERT INTO {table} (value) VALUES (?)'
+
+    changes = conn.total_changes
+    done = 0
+    try:
+        while data_num is None or done < data_num:
+            conn.execute('BEGIN')
+            end = done + TRANSACTION_SIZE
+            if data_num is not None:
+                end = min(end, data_num)
+            while done < end:
+                n = min(BATCH_SIZE, end - done)
+                conn.executemany(insert, zip(generate(args, n).split('\n')[:-1]))
+                done += n
+            conn.execute('COMMIT')
+    except KeyboardInterrupt:
+        if conn.in_transaction:
+            conn.execute('COMMIT')
+    return conn.total_changes - changes
+
+
+def checkpoint_key(args) -> dict:
+    """Returns the options that must not change between a checkpoint and a resumed run"""
+    return json.loads(json.dumps({key: getattr(args, key, None) for key in CHECKPOINT_KEYS}))
+
+
+def load_checkpoint(filename: str) -> dict:
+    """Returns the checkpoint saved for an output file, or None if there is none
+
+    Parameters
+    ----------
+    filename : str
+        Output file name
+
+    Returns
+    -------
+    dict
+        number of written rows, their size in bytes, the random module
+        state and the checkpoint key of the run
+    """
+    try:
+        with open(filename + CHECKPOINT_SUFFIX) as f:
+            ckpt = json.load(f)
+    except FileNotFoundError:
+        return None
+    version, internal, gauss_next = ckpt['state']
+    ckpt['state'] = (version, tuple(internal), gauss_next)
+    return ckpt
+
+
+def save_checkpoint(filename: str, ckpt: dict):
+    """Atomically saves a checkpoint of an output file
+
+    Parameters
+    ----------
+    filename : str
+        Output file name
+    ckpt : dict
+        Checkpoint data (see load_checkpoint)
+    """
+    path = filename + CHECKPOINT_SUFFIX
+    with open(path + '.tmp', 'w') as f:
+        json.dump(ckpt, f)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(path + '.tmp', path)
+
+
+def write_checkpointed(args, data_num: int, ckpt: dict = None) -> int:
+    """Writes generated rows to args.filename, saving a checkpoint every args.checkpoint_every rows
+
+    At each checkpoint the output is flushed and fsynced before the
+    number of rows, the byte offset and the random module state are
+    saved, together with the size of the row offset index if it is built.
+    A resumed run truncates the output to the saved offset and
+    restores the state; batches are aligned to checkpoints, so the output
+    is byte-identical to an uninterrupted run. The checkpoint is removed
+    when the run completes.
+
+    Parameters
+    ----------
+    args
+        Parsed command-line arguments (see argparser)
+    data_num : int
+        The number of rows to write
+    ckpt : dict
+        Checkpoint to resume from (see load_checkpoint)
+
+    Returns
+    -------
+    int
+        the number of written rows
+    """
+    key = checkpoint_key(args)
+    done = offset = 0
+    mode = 'wb'
+    if ckpt is not None:
+        if ckpt['args'] != key:
+            raise ValueError('checkpoint was saved with different options')
+        if not os.path.exists(args.filename):
+            raise ValueError(f'output file {args.filename} of the checkpoint is missing, '
+                             f'remove {args.filename + CHECKPOINT_SUFFIX} to start over')
+        done, offset = ckpt['rows'], ckpt['offset']
+        random.setstate(ckpt['state'])
+        mode = 'r+b'
+    index = None
+    if getattr(args, 'index', False):
+        index = IndexWriter(args.filename, args.index_stride, done, offset,
+                            None if ckpt is None else ckpt['index_entries'],
+                            args.filename + INDEX_SUFFIX + '.tmp')
+
+    with open(args.filename, mode) as f:
+        if os.fstat(f.fileno()).st_size < offset:
+            raise ValueError('output file is shorter than the checkpoint')
+        f.truncate(offset)
+        f.seek(offset)
+        while done < data_num:
+            end = min(done + args.checkpoint_every, data_num)
+            while done < end:
+                n = min(BATCH_SIZE, end - done)
+                data = generate(args, n).encode()
+                f.write(data)
+                if index is not None:
+                    index.add(data)
+                done += n
+                offset += len(data)
+            f.flush()
+            os.fsync(f.fileno())
+            if done < data_num:
+                ckpt = {'rows': done, 'offset': offset, 'state': random.getstate(), 'args': key}
+                if index is not None:
+                    index.flush()
+                    ckpt['index_entries'] = index.entries
+                save_checkpoint(args.filename, ckpt)
+    if index is not None:
+        index.close()
+    if os.path.exists(args.filename + CHECKPOINT_SUFFIX):
+        os.remove(args.filename + CHECKPOINT_SUFFIX)
+    return done
+
+
+def rows_main(argv: list):
+    """Runs the rows subcommand, printing rows [start, stop) of a generated file"""
+    parser = argparse.ArgumentParser(
+        description='Print a range of rows of a file using its row offset index.',
+        prog='GEN rows', usage='%(prog)s file start stop')
+    parser.add_argument('file', help='text file (index is built if missing)')
+    parser.add_argument('start', type=int, help='index of the first row')
+    parser.add_argument('stop', type=int, help='index after the last row')
+    args = parser.parse_args(argv)
+    if args.start < 0 or args.stop < 0:
+        sys.exit("GEN: error: row indices must not be negative")
+    try:
+        rows = read_rows(args.file, args.start, args.stop)
+    except (OSError, ValueError) as e:
+        sys.exit(f"GEN: error: {args.file}: {e}")
+    sys.stdout.write(rows)
+
+
+def verify_argparser(argv: list) -> dict:
+    """Parses options and arguments of the verify subcommand
+
+    Parameters
+    ----------
+    argv : list
+        Command-line arguments following the subcommand name
+
+    Returns
+    -------
+    dict
+        a dict of parsed command-line arguments and options
+    """
+    parser = argparse.ArgumentParser(
+        description='Check generated data for randomness in one pass.',
+        prog='GEN verify', usage='%(prog)s [options] [input]')
+    parser.add_argument('input', nargs='?', default='-',
+                        help='file to check (default: read from console)')
+    parser.add_argument('-t', '--type',
+                        choices=['int', 'float', 'str'],
+                        default='int',
+                        help='data type (default: int)')
+    parser.add_argument('--alpha', type=float,
+                        default=0.001,
+                        help='significance level of the tests (default: 0.001)')
+    group1 = parser.add_argument_group(
+        'floats', 'parameters only for float numbers')
+    group1.add_argument('-d', '--distribution',
+                        choices=['uniform', 'normal'],
+                        help='distribution type')
+    group1.add_argument('--mean', type=float,
+                        help='normal distribution mean (any value)')
+    group1.add_argument('--std', type=float,
+                        help='normal distribution standard deviation (greater than zero)')
+    group1.add_argument('--min_value', type=float,
+                        help='uniform distribution min value (should be less than or equal to max value)')
+    group1.add_argument('--max_value', type=float,
+                        help='uniform distribution max value (should be greater than or equal to min value)')
+    group2 = parser.add_argument_group(
+        'strings', 'parameters only for strings')
+    group2.add_argument('-c', '--charset',
+                        default=string.ascii_letters + string.digits + string.punctuation,
+                        help='acceptable character set (default: all letters, digits and punctuation marks)')
+
+    args = parser.parse_args(argv)
+
+    if not 0 < args.alpha < 1:
+        sys.exit("GEN: error: alpha must be between 0 and 1")
+    if args.type == 'float':
+        check_float_args(args)
+    return args
+
+
+def _gammaincc(a: float, x: float) -> float:
+    """Returns the regularized upper incomplete gamma function Q(a, x)"""
+    if x <= 0:
+        return 1.0
+    front = math.exp(-x + a * math.log(x) - math.lgamma(a))
+    if x < a + 1:
+        # series expansion of P(a, x)
+        term = total = 1.0 / a
+        ap = a
+        for _ in range(1000):
+            ap += 1
+            term *= x / ap
+            total += term
+            if term < total * 1e-15:
+                break
+        return max(0.0, 1.0 - total * front)
+    # continued fraction of Q(a, x), modified Lentz's method
+    tiny = 1e-300
+    b = x + 1 - a
+    c = 1 / tiny
+    d = 1 / b
+    h = d
+    for i in range(1, 1000):
+        an = -i * (i - a)
+        b += 2
+        d = an * d + b
+        d = 1 / (d if abs(d) > tiny else tiny)
+        c = b + an / c
+        if abs(c) < tiny:
+            c = tiny
+        h *= d * c
+        if abs(d * c - 1) < 1e-15:
+            break
+    return front * h
+
+
+def chi_square(counts: list) -> tuple:
+    """Returns Pearson's chi-square test of counts against a uniform distribution
+
+    Parameters
+    ----------
+    counts : list
+        Observed number of occurrences of each category
+
+    Returns
+    -------
+    tuple
+        chi-square statistic, degrees of freedom and p-value
+    """
+    total = sum(counts)
+    df = len(counts) - 1
+    if total == 0 or df < 1:
+        return 0.0, df, 1.0
+    expected = total / len(counts)
+    stat = sum((c - expected) ** 2 for c in counts) / expected
+    return stat, df, _gammaincc(df / 2, stat / 2)
+
+
+def ks_pvalue(d: float, n: int) -> float:
+    """Returns the asymptotic p-value of the Kolmogorov-Smirnov statistic
+
+    Parameters
+    ----------
+    d : float
+        Maximum distance between empirical and reference distribution functions
+    n : int
+        Sample size
+
+    Returns
+    -------
+    float
+        p-value of the one-sample test
+    """
+    en = math.sqrt(n)
+    lam = (en + 0.12 + 0.11 / en) * d
+    if lam < 0.2:
+        return 1.0
+    total = 0.0
+    for j in range(1, 101):
+        term = math.exp(-2 * j * j * lam * lam)
+        total += term if j % 2 else -term
+        if term < 1e-12:
+            break
+    return min(1.0, max(0.0, 2 * total))
+
+
+class KMinValues:
+    """Estimates the number of distinct items in constant memory
+
+    The sketch keeps the k smallest distinct (signed 64-bit) hashes of the
+    items, a k-minimum values sketch. Hashes are computed and filtered in
+    bulk, so only those below the current threshold reach Python code, and
+    the count is exact while fewer than k distinct items have been seen.
+
+    Attributes
+    ----------
+    k : int
+        Number of kept hashes
+    values : set
+        The smallest hashes seen so far
+    threshold : int
+        Hashes at or above it cannot enter the sketch
+    """
+
+    def __init__(self, k: int = 1 << 16):
+        self.k = k
+        self.values = set()
+        self.threshold = 1 << 63
+
+    def update(self, items: list):
+        """Adds a list of hashable items to the sketch"""
+        for start in range(0, len(items), self.k):
+            hashes = map(hash, items[start:start + self.k])
+            self.values.update(filter(self.threshold.__gt__, hashes))
+            if len(self.values) > 2 * self.k:
+                kept = sorted(self.values)[:self.k]
+                self.values = set(kept)
+                self.threshold = kept[-1]
+
+    def exact(self) -> bool:
+        """Returns True while the count is exact"""
+        return len(self.values) < self.k
+
+    def error(self) -> float:
+        """Returns the relative standard error of the count"""
+        return 0.0 if self.exact() else 1 / math.sqrt(self.k - 2)
+
+    def count(self) -> int:
+        """Returns the estimated number of distinct items"""
+        if self.exact():
+            return len(self.values)
+        kth = heapq.nsmallest(self.k, self.values)[-1] + 2 ** 63
+        return round((self.k - 1) * 2.0 ** 64 / kth)
+
+
+def _blocks(f):
+    """Yields newline-terminated blocks of about CHUNK_SIZE bytes read from f"""
+    tail = b''
+    while True:
+        chunk = f.read(CHUNK_SIZE)
+        if not chunk:
+            break
+        chunk = tail + chunk
+        cut = chunk.rfind(b'\n') + 1
+        tail = chunk[cut:]
+        if cut:
+            yield chunk[:cut]
+    if tail:
+        yield tail + b'\n'
+
+
+def verify(f, args) -> dict:
+    """Checks generated rows read from a binary stream in one pass
+
+    Memory use does not depend on the input size: characters and last
+    digits are counted per category, floats are mapped through the
+    reference distribution function into KS_BINS bins, and distinct rows
+    are estimated with a k-minimum values sketch. Characters outside an ASCII
+    charset are found in every block, while the character frequencies are
+    counted on the first CHAR_SAMPLE bytes of each block. When numpy is
+    installed, the parsed floats of a block are binned at once.
+
+    Parameters
+    ----------
+    f
+        A readable binary stream
+    args
+        Parsed verify arguments (see verify_argparser)
+
+    Returns
+    -------
+    dict
+        number of rows, estimated distinct rows and the relative standard
+        error of the estimate, a list of (name, statistic, degrees of
+        freedom, p-value) tests and a list of errors
+
+    Raises
+    ------
+    ValueError
+        If a float row is not a number
+    """
+    sketch = KMinValues()
+    rows = 0
+    chars = collections.Counter()
+    foreign = 0
+    if args.type == 'str' and args.charset.isascii():
+        symbols = [(c, c.encode()) for c in dict.fromkeys(args.charset)]
+        known = args.charset.encode() + b'\n'
+    digits = [0] * 10
+    hist = [0] * KS_BINS
+    outside = 0
+    if args.type == 'float':
+        if args.distribution == 'uniform':
+            loc, scale = args.min_value, args.max_value - args.min_value
+        else:
+            loc, scale = args.mean, args.std * math.sqrt(2)
+    np = None
+    if args.type == 'float' and scale and importlib.util.find_spec('numpy') is not None:
+        import numpy as np  # optional dependency, imported only when used
+        import statistics
+        bins = np.zeros(KS_BINS, dtype=np.int64)
+        if args.distribution == 'normal':
+            # bin edges mapped back through the inverse distribution function
+            ref = statistics.NormalDist(args.mean, args.std)
+            edges = np.array([ref.inv_cdf(i / KS_BINS) for i in range(1, KS_BINS)])
+
+    for block in _blocks(f):
+        lines = block.split(b'\n')
+        lines.pop()
+        rows += len(lines)
+        sketch.update(lines)
+        if args.type == 'str' and args.charset.isascii():
+            rest = block.translate(None, known)
+            if rest:
+                foreign += len(rest.decode(errors='replace'))
+            sample = block[:block.rfind(b'\n', 0, CHAR_SAMPLE) + 1 or None]
+            for c, symbol in symbols:
+                chars[c] += sample.count(symbol)
+        elif args.type == 'str':
+            chars.update(block.decode())
+        elif args.type == 'int':
+            last = b''.join(map(operator.itemgetter(slice(-1, None)), lines))
+            for i, digit in enumerate(b'0123456789'):
+                digits[i] += last.count(digit)
+        elif scale == 0:
+            outside += sum(1 for x in map(float, lines) if x != loc)
+        elif np is not None:
+            values = np.fromiter(map(float, lines), float, len(lines))
+            if args.distribution == 'uniform':
+                u = (values - loc) / scale
+                inside = (u >= 0) & (u <= 1)
+                outside += len(u) - int(np.count_nonzero(inside))
+                idx = np.minimum((u[inside] * KS_BINS).astype(np.int64), KS_BINS - 1)
+            else:
+                idx = np.searchsorted(edges, values, side='right')
+            bins += np.bincount(idx, minlength=KS_BINS)
+        elif args.distribution == 'uniform':
+            for x in map(float, lines):
+                u = (x - loc) / scale
+                if 0 <= u <= 1:
+                    hist[min(int(u * KS_BINS), KS_BINS - 1)] += 1
+                else:
+                    outside += 1
+        else:
+            erf = math.erf
+            for x in map(float, lines):
+                u = 0.5 * (1 + erf((x - loc) / scale))
+                hist[min(int(u * KS_BINS), KS_BINS - 1)] += 1
+
+    if np is not None:
+        hist = bins.tolist()
+    tests = []
+    errors = []
+    if args.type == 'str':
+        del chars['\n']
+        charset = dict.fromkeys(args.charset)
+        foreign += sum(n for c, n in chars.items() if c not in charset)
+        if foreign:
+            errors.append(f'{foreign} characters outside the charset')
+        if rows:
+            tests.append(('Character chi-square',
+                          *chi_square([chars[c] for c in charset])))
+    elif args.type == 'int':
+        if rows:
+            tests.append(('Last digit chi-square', *chi_square(digits)))
+    else:
+        if outside:
+            errors.append(f'{outside} values outside the distribution range')
+        n = sum(hist)
+        if n:
+            cum = 0
+            d = 0.0
+            for i, count in enumerate(hist, 1):
+                cum += count
+                d = max(d, abs(cum / n - i / KS_BINS))
+            tests.append((f'Kolmogorov-Smirnov ({args.distribution})',
+                          d, None, ks_pvalue(d, n)))
+    return {'rows': rows, 'distinct': min(rows, sketch.count()),
+            'distinct_error': sketch.error(), 'tests': tests, 'errors': errors}
+
+
+def verify_main(argv: list):
+    """Runs the verify subcommand and exits with status 1 if any check fails"""
+    args = verify_argparser(argv)
+    try:
+        if args.input == '-':
+            report = verify(sys.stdin.buffer, args)
+        else:
+            with open(args.input, 'rb') as f:
+                report = verify(f, args)
+    except (OSError, ValueError) as e:
+        sys.exit(f"GEN: error: {args.input}: {e}")
+
+    rows = report['rows']
+    failed = bool(report['errors'])
+    print(f'Rows: {rows}')
+    if rows:
+        duplicates = 1 - report['distinct'] / rows
+        # three standard errors of the distinct rows estimate
+        bound = 3 * report['distinct_error'] * report['distinct'] / rows
+        if not bound:
+            rate = f'{duplicates:.4%}'
+        elif duplicates < bound:
+            rate = f'indistinguishable from zero (error bound {bound:.4%})'
+        else:
+            rate = f'{duplicates:.4%} +/- {bound:.4%}'
+        print(f'Distinct rows (estimate): {report["distinct"]}, '
+              f'duplicate rate (estimate): {rate}')
+    for name, stat, df, p_value in report['tests']:
+        passed = p_value >= args.alpha
+        failed = failed or not passed
+        df = '' if df is None else f', df={df}'
+        print(f'{name}: statistic={stat:.6g}{df}, p-value={p_value:.6g} '
+              f'{"PASS" if passed else "FAIL"}')
+    for error in report['errors']:
+        print(f'Error: {error}')
+    if failed:
+        sys.exit(1)
+
+
+def report_unique(args, data_num: int, result: str = None, file=None):
+    """Prints the exact number of distinct generated strings
+
+    Parameters
+    ----------
+    args
+        Parsed command-line arguments (see argparser)
+    data_num : int
+        The number of generated strings
+    result : str
+        Generated strings, if they are kept in memory
+    file
+        Stream to print the report to (default: console)
+    """
+    if args.filename != '':
+        with open(args.filename) as f:
+            distinct = count_distinct(f)
+    elif result is not None:
+        distinct = count_distinct(io.StringIO(result))
+    else:
+        print(f'Rejected duplicate candidates: {args.seen.rejected}', file=file)
+        return
+    share = distinct / data_num if data_num else 1.0
+    print(f'Unique strings: {distinct} of {data_num} ({share:.4%}), '
+          f'rejected duplicate candidates: {args.seen.rejected}', file=file)
+
+
+def _frame_label(filename: str, lineno: int, name: str) -> str:
+    """Returns a flamegraph frame label of a function"""
+    if filename == '~':
+        label = name
+    else:
+        label = f'{name} ({os.path.basename(filename)}:{lineno})'
+    return label.replace(';', ':')
+
+
+def collapse_pstats(stats: dict) -> dict:
+    """Returns collapsed stacks derived from pstats data
+
+    cProfile records only caller-callee edges, so each call path gets the
+    share of the callee time that the edge from its caller accounts for.
+    Recursive calls are not expanded.
+
+    Parameters
+    ----------
+    stats : dict
+        The stats attribute of a pstats.Stats object
+
+    Returns
+    -------
+    dict
+        a dict mapping semicolon-separated stacks to self time in microseconds
+    """
+    children = collections.defaultdict(dict)
+    for func, (_, _, _, _, callers) in stats.items():
+        for caller, edge in callers.items():
+            children[caller][func] = edge[3]
+    stacks = collections.Counter()
+
+    def walk(func, path, on_path, share):
+        _, _, tt, ct, _ = stats[func]
+        path = f'{path};{_frame_label(*func)}' if path else _frame_label(*func)
+        stacks[path] += tt * share * 1e6
+        for child, edge_ct in children[func].items():
+            child_ct = stats[child][3]
+            child_share = share * edge_ct / child_ct if child_ct > 0 else 0.0
+            if child not in on_path and child_ct * child_share * 1e6 >= 1:
+                walk(child, path, on_path | {child}, child_share)
+
+    for func, (_, _, _, _, callers) in stats.items():
+        if not callers:
+            walk(func, '', {func}, 1.0)
+    return {stack: round(us) for stack, us in stacks.items() if round(us) > 0}
+
+
+class Profiler:
+    """Context manager that profiles a block and saves the results
+
+    In deterministic mode the block runs under cProfile, pstats data is
+    saved to path and collapsed stacks derived from it to path.collapsed.
+    In sampling mode a background thread records the stack of the
+    profiled thread every interval seconds, and only the collapsed stacks
+    (sample counts) are saved.
+
+    Attributes
+    ----------
+    path : str
+        Output file name
+    mode : str
+        Profiling mode (deterministic or sampling)
+    interval : float
+        Sampling interval in seconds
+    """
+
+    def __init__(self, path: str, mode: str = 'deterministic', interval: float = 0.005):
+        self.path = path
+        self.mode = mode
+        self.interval = interval
+
+    def __enter__(self):
+        if self.mode == 'deterministic':
+            import cProfile  # imported only with --profile
+            self._profile = cProfile.Profile()
+            self._profile.enable()
+        else:
+            import threading  # imported only with --profile
+            self._samples = collections.Counter()
+            self._done = threading.Event()
+            self._thread = threading.Thread(
+                target=self._sample, args=(threading.get_ident(),), daemon=True)
+            self._thread.start()
+        return self
+
+    def _sample(self, ident: int):
+        """Records the stack of thread ident until the block exits"""
+        while not self._done.wait(self.interval):
+            frame = sys._current_frames().get(ident)
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append(_frame_label(code.co_filename, code.co_firstlineno, code.co_name))
+                frame = frame.f_back
+            if stack:
+                self._samples[';'.join(reversed(stack))] += 1
+
+    def __exit__(self, *exc):
+        if self.mode == 'deterministic':
+            self._profile.disable()
+            self._profile.dump_stats(self.path)
+            import pstats  # imported only with --profile
+            stacks = collapse_pstats(pstats.Stats(self._profile).stats)
+        else:
+            self._done.set()
+            self._thread.join()
+            stacks = self._samples
+        with open(self.path + '.collapsed', 'w') as f:
+            for stack, value in sorted(stacks.items()):
+                f.write(f'{stack} {value}\n')
+
+
+def run(args) -> dict:
+    """Generates data and writes it to the selected output
+
+    Parameters
+    ----------
+    args
+        Parsed command-line arguments (see argparser)
+
+    Returns
+    -------
+    dict
+        number of rows, algorithm execution time, wall time and the
+        generated data if it was kept in memory
+    """
+    wall = time.perf_counter()
+    result = None
+    if args.sqlite is not None:
+        start = time.process_time()
+        conn = connect_sqlite(args.sqlite, args.journal_mode, args.synchronous, args.cache_size)
+        try:
+            rows = load_sqlite(args, conn, args.data_num)
+        finally:
+            conn.close()
+        alg = time.process_time() - start
+    elif args.checkpoint_every is not None:
+        start = time.process_time()
+        rows = write_checkpointed(args, args.data_num, getattr(args, 'checkpoint', None))
+        alg = time.process_time() - start
+    elif args.follow or args.rate is not None or (args.unique and args.filename != ''):
+        # unique strings are written batch by batch, so memory is the
+        # Bloom filter and one batch
+        start = time.process_time()
+        if args.filename != '':
+            with open_output(args) as f:
+                rows, _ = stream(args, f, args.data_num, args.rate)
+        else:
+            rows, _ = stream(args, sys.stdout, args.data_num, args.rate)
+        alg = time.process_time() - start
+    else:
+        start = time.process_time()
+        result = generate(args, args.data_num)
+        end = time.process_time()
+        alg = end - start
+        rows = args.data_num
+
+        if args.filename != '':
+            with open_output(args) as f:
+                f.write(result)
+        else:
+            print(f'Generated data:\n{result}')
+    return {'rows': rows, 'alg': alg, 'wall': time.perf_counter() - wall, 'result': result}
+
+
+def resolve_engine(args):
+    """Replaces engine auto in args with the engine to use
+
+    A resumed run keeps the engine saved in its checkpoint, otherwise the
+    engine is picked by select_engine.
+
+    Parameters
+    ----------
+    args
+        Parsed command-line arguments (see argparser)
+    """
+    if args.engine != 'auto':
+        return
+    ckpt = load_checkpoint(args.filename) if args.resume else None
+    args.engine = ckpt['args']['engine'] if ckpt is not None else select_engine(args)
+
+
+def prepare(args):
+    """Seeds the random module and sets up the state used by run
+
+    Parameters
+    ----------
+    args
+        Parsed command-line arguments (see argparser)
+
+    Raises
+    ------
+    ValueError
+        If the file to draw lines from has too few lines
+    """
+    random.seed(a=0 if args.seed is None else args.seed)
+    resolve_engine(args)
+    if args.unique:
+        args.seen = BloomFilter(args.data_num)
+    if args.from_file is not None:
+        args.sampler = LineSampler(args.from_file, args.data_num, args.replace)
+    if args.resume:
+        args.checkpoint = load_checkpoint(args.filename)
+
+
+def load_jobs(path: str) -> list:
+    """Returns dataset definitions read from a JSON or TOML spec file
+
+    The spec is either a list of datasets or a table with a list of
+    datasets under "jobs" and common options under "defaults". Every
+    dataset is a table of command-line options keyed by their long names
+    (data_num for the number of rows) and may have a "name".
+
+    Parameters
+    ----------
+    path : str
+        Spec file name (.toml files are read as TOML, others as JSON)
+
+    Returns
+    -------
+    list
+        a list of dicts of options
+    """
+    with open(path, 'rb') as f:
+        data = f.read()
+    if path.endswith('.toml'):
+        try:
+            import tomllib  # imported only for TOML job specs
+        except ImportError:  # Python < 3.11
+            raise ValueError('TOML job specs require Python 3.11 or newer') from None
+        spec = tomllib.loads(data.decode())
+    else:
+        spec = json.loads(data)
+    jobs, defaults = spec, {}
+    if isinstance(spec, dict):
+        jobs, defaults = spec.get('jobs'), spec.get('defaults', {})
+    if not isinstance(jobs, list) or not all(isinstance(job, dict) for job in jobs):
+        raise ValueError('job spec must contain a list of jobs')
+    return [{**defaults, **job} for job in jobs]
+
+
+def job_argv(job: dict, parser: argparse.ArgumentParser) -> list:
+    """Returns the command-line arguments of a dataset definition
+
+    Parameters
+    ----------
+    job : dict
+        Options keyed by their long names (see load_jobs)
+    parser : argparse.ArgumentParser
+        The command-line parser (see make_parser)
+
+    Returns
+    -------
+    list
+        a list of arguments for argparser
+    """
+    actions = {action.dest: action for action in parser._actions}
+    argv = []
+    for key, value in job.items():
+        dest = key.replace('-', '_')
+        if dest == 'name':
+            continue
+        action = actions.get(dest)
+        if action is None or dest in ('help', 'jobs', 'workers'):
+            raise ValueError(f'unknown option {key}')
+        if not action.option_strings:
+            argv.insert(0, str(value))
+        elif action.nargs == 0:
+            if value:
+                argv.append(action.option_strings[-1])
+        elif isinstance(value, dict):
+            raise ValueError(f'option {key} must be a value or a list, not a table')
+        elif isinstance(value, list):
+            # [[3, 1], [8, 2.5]] or ['3:1', '8:2.5'] becomes 3:1,8:2.5
+            items = (':'.join(map(str, x)) if isinstance(x, list) else str(x) for x in value)
+            argv.append(f'{action.option_strings[-1]}={",".join(items)}')
+        else:
+            argv.append(f'{action.option_strings[-1]}={value}')
+    return argv
+
+
+def run_job(args) -> dict:
+    """Prepares and runs one dataset of a batch job in a worker process
+
+    Parameters
+    ----------
+    args
+        Parsed command-line arguments of the dataset (see argparser)
+
+    Returns
+    -------
+    dict
+        number of rows, algorithm execution time, wall time of the run
+        and time spent in prepare (e.g. building a line index)
+    """
+    start = time.perf_counter()
+    prepare(args)
+    prepared = time.perf_counter() - start
+    stats = run(args)
+    del stats['result']
+    stats['prepare'] = prepared
+    return stats
+
+
+def run_jobs(args):
+    """Runs the datasets of a job spec file and prints a timing summary
+
+    All datasets are parsed and validated first, and the line index of
+    every distinct --from-file input is built or checked once, then the
+    datasets run in a pool of warm worker processes, largest first, each
+    writing its own file.
+    Charset tables are cached per worker, and engine auto is resolved once
+    in the parent process, so calibration runs at most once per
+    parameter class. Exits with status 1 if any dataset fails.
+
+    Parameters
+    ----------
+    args
+        Parsed command-line arguments (see argparser)
+    """
+    parser = make_parser()
+    try:
+        jobs = load_jobs(args.jobs)
+    except (OSError, ValueError) as e:
+        sys.exit(f"GEN: error: {args.jobs}: {e}")
+
+    parsed = []
+    outputs = {}
+    for i, job in enumerate(jobs, 1):
+        name = str(job.get('name') or job.get('filename') or f'job {i}')
+        try:
+            job_args = argparser(job_argv(job, parser))
+        except ValueError as e:
+            sys.exit(f"GEN: error: {name}: {e}")
+        except SystemExit as e:
+            if isinstance(e.code, str):
+                sys.exit(f"GEN: error: {name}: {e.code.replace('GEN: error: ', '')}")
+            raise
+        if job_args.filename == '':
+            sys.exit(f"GEN: error: {name}: every job requires a filename")
+        if (job_args.follow or job_args.rate is not None or job_args.sqlite is not None
+                or job_args.profile is not None or job_args.jobs is not None):
+            sys.exit(f"GEN: error: {name}: jobs cannot use --follow, --rate, --sqlite, "
+                     f"--profile or --jobs")
+        output = os.path.abspath(job_args.filename)
+        if output in outputs:
+            sys.exit(f"GEN: error: {name}: filename {job_args.filename} is also used by {outputs[output]}")
+        outputs[output] = name
+        resolve_engine(job_args)
+        parsed.append((name, job_args))
+    if not parsed:
+        sys.exit(f"GEN: error: {args.jobs}: no jobs")
+    for name, job_args in parsed:
+        if job_args.from_file is not None:
+            try:
+                # workers sharing a file must find its index ready
+                LineIndex(job_args.from_file, stride=1).close()
+            except OSError as e:
+                sys.exit(f"GEN: error: {name}: {e}")
+
+    def work(job_args):
+        return job_args.data_num * (job_args.length if job_args.type == 'str' else 1)
+
+    order = sorted(range(len(parsed)), key=lambda i: -work(parsed[i][1]))
+    results = [None] * len(parsed)
+    from concurrent.futures import ProcessPoolExecutor, as_completed  # imported only with --jobs
+    start = time.perf_counter()
+    with ProcessPoolExecutor(max_workers=min(args.workers, len(parsed))) as pool:
+        futures = {pool.submit(run_job, parsed[i][1]): i for i in order}
+        for future in as_completed(futures):
+            try:
+                results[futures[future]] = future.result()
+            except Exception as e:
+                results[futures[future]] = e
+    total = time.perf_counter() - start
+
+    width = max(len('Dataset'), *(len(name) for name, _ in parsed))
+    print(f'{"Dataset":<{width}}  {"Rows":>12}  {"Engine":<8}  {"Time, s":>9}')
+    failed = False
+    for (name, job_args), res in zip(parsed, results):
+        if isinstance(res, Exception):
+            failed = True
+            print(f'{name:<{width}}  failed: {res}')
+        else:
+            engine = job_args.engine if _engine_used(job_args) else '-'
+            print(f'{name:<{width}}  {res["rows"]:>12}  {engine:<8}  '
+                  f'{res["prepare"] + res["wall"]:>9.3f}')
+    busy = sum(res['prepare'] + res['wall'] for res in results if not isinstance(res, Exception))
+    print(f'Total: {len(parsed)} datasets in {total:.3f} seconds '
+          f'(sum of dataset times {busy:.3f} seconds, {min(args.workers, len(parsed))} workers)')
+    if failed:
+        sys.exit(1)
+
+
+def main():
+    if sys.argv[1:2] == ['verify']:
+        verify_main(sys.argv[2:])
+        return
+    if sys.argv[1:2] == ['rows']:
+        rows_main(sys.argv[2:])
+        return
+    args = argparser()
+    if args.jobs is not None:
+        run_jobs(args)
+        return
+    try:
+        prepare(args)
+    except (OSError, ValueError) as e:
+        sys.exit(f"GEN: error: {e}")
+    if args.from_file is not None:
+        # sampled lines are written back byte for byte
+        sys.stdout.reconfigure(errors='surrogateescape')
+
+    try:
+        if args.profile is not None:
+            with Profiler(args.profile, args.profile_mode, args.profile_interval):
+                stats = run(args)
+        else:
+            stats = run(args)
+    except ValueError as e:
+        sys.exit(f"GEN: error: {e}")
 
+    rows = stats['rows']
+    wall = stats['wall']
+    streamed = args.follow or args.rate is not None
+    report = sys.stderr if streamed else sys.stdout
+    if args.rate is not None:
+        achieved = rows / wall if wall > 0 else 0.0
+        print(f'Target rate: {args.rate} rows/s, achieved rate: {achieved:.1f} rows/s '
+              f'({rows} rows in {wall:.3f} seconds)', file=report)
     if args.timeit:
-        print(f'Algorithm execution time: {alg} seconds')
+        if args.engine_given and _engine_used(args):
+            print(f'Engine: {args.engine}', file=report)
+        print(f'Algorithm execution time: {stats["alg"]} seconds', file=report)
+        if args.sqlite is not None:
+            print(f'Insert throughput: {rows / wall if wall > 0 else 0.0:.1f} rows/s '
+                  f'({rows} rows in {wall:.3f} seconds)', file=report)
+    if args.unique:
+        report_unique(args, rows, stats['result'], file=report)
 
 
 if __name__ == "__main__":
@@ -1,8 +1,34 @@
+import argparse
+import collections
+import contextlib
+import importlib.util
+import io
+import itertools
+import json
+import os
+import tempfile
 import unittest
 import random
+import sqlite3
 import string
+import subprocess
+import sys
+import time
+from unittest import mock
 
-from gen import gen_str, gen_int, gen_float
+import gen
+from gen import gen_str, gen_int, gen_float, generate, stream, chi_square, verify
+from gen import KMinValues, verify_main
+from gen import BloomFilter, gen_str_unique, count_distinct
+from gen import LineIndex, LineSampler, floyd_sample
+from gen import connect_sqlite, load_sqlite
+from gen import Profiler
+from gen import gen_str_bulk, gen_int_bulk, gen_float_bulk, select_engine
+from gen import secure_indices, gen_str_secure, gen_int_secure, gen_float_secure
+from gen import load_checkpoint, write_checkpointed
+from gen import open_output, read_rows
+from gen import job_argv, load_jobs, make_parser, run_jobs
+from gen import draw_lengths, gen_str_lengths
 
 
 class TestGenStr(unittest.TestCase):
@@ -51,13 +77,13 @@ class TestGenStr(unittest.TestCase):
         Test if generated strings are random
         """
         random.seed(0)
-        data_num = 10
+        data_num = 1000
         charset = string.ascii_letters
-        length = 5
+        length = 8
 
-        got = [gen_str(data_num, charset, length) for _ in range(1000)]
+        got = gen_str(data_num, charset, length).split('\n')[:-1]
 
-        self.assertTrue(len(set(got)) == len(got))
+        self.assertTrue(len(set(got)) == len(got) == data_num)
 
     def test_seed_str(self):
         """
@@ -77,6 +103,707 @@ class TestGenStr(unittest.TestCase):
         self.assertTrue(got1 == got3 and got1 != got2)
 
 
+class TestLengthDist(unittest.TestCase):
+    def test_draw_lengths(self):
+        """
+        Test ranges of drawn string lengths
+        """
+        random.seed(0)
+        uniform = argparse.Namespace(length_dist='uniform', length_min=2, length_max=5)
+        normal = argparse.Namespace(length_dist='normal', length_mean=1, length_std=3)
+        empirical = argparse.Namespace(length_dist='empirical', length_weights=[(3, 1), (8, 0), (9, 2)])
+
+        self.assertEqual(set(draw_lengths(uniform, 1000)), {2, 3, 4, 5})
+        self.assertEqual(min(draw_lengths(normal, 1000)), 0)
+        self.assertEqual(set(draw_lengths(empirical, 1000)), {3, 9})
+
+    def test_gen_str_lengths(self):
+        """
+        Test if strings are cut by the given lengths
+        """
+        random.seed(0)
+        lengths = [0, 5, 1, 12, 3]
+
+        got = gen_str_lengths(lengths, 'abc').split('\n')[:-1]
+        secure = gen_str_lengths(lengths, 'abc', secure=True).split('\n')[:-1]
+
+        self.assertEqual([len(x) for x in got], lengths)
+        self.assertEqual([len(x) for x in secure], lengths)
+        self.assertTrue(set(''.join(got + secure)) <= set('abc'))
+
+    def test_generate_lengths(self):
+        """
+        Test if seed change affects strings of variable length
+        """
+        args = argparse.Namespace(type='str', engine='bulk', charset=string.ascii_letters,
+                                  length_dist='uniform', length_min=0, length_max=9)
+        random.seed(1)
+        got1 = generate(args, 20)
+        random.seed(2)
+        got2 = generate(args, 20)
+        random.seed(1)
+        got3 = generate(args, 20)
+
+        self.assertTrue(got1 == got3 and got1 != got2)
+        self.assertEqual(got1.count('\n'), 20)
+
+
+class TestUnique(unittest.TestCase):
+    def test_bloom_filter(self):
+        """
+        Test Bloom filter has no false negatives and a bounded false positive rate
+        """
+        bloom = BloomFilter(10000)
+
+        added = [bloom.add(str(i)) for i in range(10000)]
+        repeated = [bloom.add(str(i)) for i in range(10000)]
+        false_positives = sum(str(i) in bloom for i in range(10000, 20000))
+
+        self.assertLess(added.count(False), 10000 * 0.02)
+        self.assertFalse(any(repeated))
+        self.assertLess(false_positives, 10000 * 0.02)
+
+    def test_unique_str(self):
+        """
+        Test if generated strings are distinct
+        """
+        random.seed(0)
+        data_num = 300
+        charset = 'abc'
+        length = 6
+
+        got = gen_str_unique(data_num, charset, length, BloomFilter(data_num))
+        rows = got.split('\n')[:-1]
+
+        self.assertEqual(len(rows), data_num)
+        self.assertEqual(len(set(rows)), data_num)
+
+    def test_count_distinct(self):
+        """
+        Test exact distinct count over several sorted runs
+        """
+        lines = [f'{i % 37}\n' for i in range(1000)]
+
+        self.assertEqual(count_distinct(lines, run_size=100), 37)
+
+    def test_count_distinct_passes(self):
+        """
+        Test exact distinct count merged in several passes with a small fan-in
+        """
+        lines = [f'{i % 37}\n' for i in range(1000)]
+
+        self.assertEqual(count_distinct(lines, run_size=10, fan_in=3), 37)
+        self.assertEqual(count_distinct(lines[:25], run_size=10, fan_in=3), 25)
+
+    def test_unique_file(self):
+        """
+        Test if unique strings are written to a file batch by batch
+        """
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, 'out.txt')
+            args = gen.argparser(['2500', '-t', 'str', '-l', '4', '-c', 'abcdefghij',
+                                  '--unique', '-f', path])
+            gen.prepare(args)
+            with mock.patch.object(gen, 'BATCH_SIZE', 1000):
+                stats = gen.run(args)
+            with open(path) as f:
+                rows = f.read().split('\n')[:-1]
+
+        self.assertIsNone(stats['result'])
+        self.assertEqual(len(rows), 2500)
+        self.assertEqual(len(set(rows)), 2500)
+
+    def test_hash_seed(self):
+        """
+        Test if seeded unique strings do not depend on PYTHONHASHSEED
+        """
+        script = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'gen.py')
+        outputs = []
+        with tempfile.TemporaryDirectory() as tmp:
+            for hash_seed in ('1', '2'):
+                path = os.path.join(tmp, f'out{hash_seed}.txt')
+                subprocess.run([sys.executable, script, '5000', '-t', 'str', '-l', '4',
+                                '-c', 'abcdefghij', '--unique', '-s', '5', '-f', path],
+                               env=dict(os.environ, PYTHONHASHSEED=hash_seed),
+                               check=True, stdout=subprocess.DEVNULL)
+                with open(path) as f:
+                    outputs.append(f.read())
+
+        self.assertEqual(outputs[0].count('\n'), 5000)
+        self.assertEqual(outputs[0], outputs[1])
+
+
+class TestFromFile(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmp.name, 'corpus.txt')
+        with open(self.path, 'w') as f:
+            f.write('a\nbb\n\nccc\ndddd')
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_floyd_sample(self):
+        """
+        Test if Floyd sampling draws distinct integers from the range
+        """
+        random.seed(0)
+
+        got = floyd_sample(100, 60)
+
+        self.assertEqual(len(set(got)), 60)
+        self.assertTrue(all(0 <= i < 100 for i in got))
+
+    def test_line_index(self):
+        """
+        Test line offsets and rebuilding of a stale index
+        """
+        with LineIndex(self.path) as index:
+            self.assertEqual(index.offsets.tolist(), [0, 2, 5, 6, 10, 14])
+        with open(self.path, 'a') as f:
+            f.write('\ne\n')
+        with LineIndex(self.path) as index:
+            self.assertEqual(index.rows, 6)
+
+    def test_sample_without_replacement(self):
+        """
+        Test if every line is drawn once without replacement
+        """
+        random.seed(0)
+        sampler = LineSampler(self.path, 5)
+
+        got = sampler.sample(3) + sampler.sample(2)
+        sampler.close()
+
+        self.assertEqual(sorted(got.split('\n')[:-1]), ['', 'a', 'bb', 'ccc', 'dddd'])
+
+    def test_sample_seed(self):
+        """
+        Test if seed change affects drawn lines
+        """
+        sampler = LineSampler(self.path, replace=True)
+        random.seed(1)
+        got1 = sampler.sample(20)
+        random.seed(2)
+        got2 = sampler.sample(20)
+        random.seed(1)
+        got3 = sampler.sample(20)
+        sampler.close()
+
+        self.assertTrue(got1 == got3 and got1 != got2)
+        self.assertEqual(got1.count('\n'), 20)
+
+    def test_cached_index(self):
+        """
+        Test if the index is kept in the user cache when it cannot be written next to the file
+        """
+        build = gen.build_line_index
+
+        def read_only(path, stride=1, index_path=None):
+            if index_path is None:
+                raise PermissionError(13, 'Permission denied')
+            build(path, stride, index_path)
+
+        cache = os.path.join(self.tmp.name, 'cache')
+        with mock.patch.dict(os.environ, XDG_CACHE_HOME=cache), \
+                mock.patch.object(gen, 'build_line_index', side_effect=read_only):
+            with LineIndex(self.path) as index:
+                rows = index.rows
+            cached = gen.cached_index_path(self.path)
+
+        self.assertEqual(rows, 5)
+        self.assertTrue(cached.startswith(cache))
+        self.assertTrue(os.path.exists(cached))
+        self.assertFalse(os.path.exists(self.path + '.idx'))
+
+    def test_bytes_preserved(self):
+        """
+        Test if lines that are not valid UTF-8 are written back unchanged
+        """
+        with open(self.path, 'wb') as f:
+            f.write(b'caf\xe9\n')
+        out = os.path.join(self.tmp.name, 'out.txt')
+        sampler = LineSampler(self.path, replace=True)
+
+        for index in (False, True):
+            args = argparse.Namespace(filename=out, index=index, index_stride=1)
+            with open_output(args) as f:
+                f.write(sampler.sample(2))
+            with open(out, 'rb') as f:
+                self.assertEqual(f.read(), b'caf\xe9\n' * 2)
+        sampler.close()
+
+
+class TestSqlite(unittest.TestCase):
+    def test_load_int(self):
+        """
+        Test if inserted integers match the text output
+        """
+        args = argparse.Namespace(type='int', table='data')
+        conn = connect_sqlite(':memory:', 'OFF', 'OFF', 1024)
+
+        random.seed(1)
+        done = load_sqlite(args, conn, 25000)
+        random.seed(1)
+        expected = [int(x) for x in gen_int(25000).split()]
+        got = conn.execute('SELECT value FROM data ORDER BY rowid').fetchall()
+
+        self.assertEqual(done, 25000)
+        self.assertEqual([x for x, in got], expected)
+
+    def test_load_float(self):
+        """
+        Test if floats are stored as real numbers in a quoted table
+        """
+        args = argparse.Namespace(type='float', table='my "floats"', distribution='uniform',
+                                  min_value=0, max_value=1, mean=None, std=None)
+        conn = connect_sqlite(':memory:', 'OFF', 'OFF', 1024)
+
+        load_sqlite(args, conn, 100)
+        got = conn.execute('SELECT typeof(value), count(*) FROM "my ""floats""" GROUP BY 1').fetchall()
+
+        self.assertEqual(got, [('real', 100)])
+
+    def test_interrupt(self):
+        """
+        Test if rows of a batch committed on interrupt are counted
+        """
+        class Interrupted(sqlite3.Connection):
+            def executemany(self, *a):
+                cursor = super().executemany(*a)
+                if self.total_changes >= 2 * gen.BATCH_SIZE:
+                    raise KeyboardInterrupt
+                return cursor
+
+        args = argparse.Namespace(type='int', table='data')
+        conn = sqlite3.connect(':memory:', isolation_level=None, factory=Interrupted)
+
+        done = load_sqlite(args, conn, 10 * gen.BATCH_SIZE)
+        stored, = conn.execute('SELECT count(*) FROM data').fetchone()
+
+        self.assertEqual(stored, 2 * gen.BATCH_SIZE)
+        self.assertEqual(done, stored)
+
+
+class TestProfiler(unittest.TestCase):
+    def test_profile(self):
+        """
+        Test if pstats data and collapsed stacks are saved
+        """
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, 'gen.prof')
+            with Profiler(path):
+                gen_str(200, string.ascii_letters, 10)
+            with open(path + '.collapsed') as f:
+                stacks = dict(line.rsplit(' ', 1) for line in f.read().splitlines())
+
+            self.assertTrue(os.path.getsize(path) > 0)
+        self.assertTrue(any('gen_str' in stack and 'choice' in stack for stack in stacks))
+        self.assertTrue(all(int(value) > 0 for value in stacks.values()))
+
+    def test_sampling_profile(self):
+        """
+        Test if sampling mode saves collapsed stacks only
+        """
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, 'gen.prof')
+            with Profiler(path, 'sampling', 0.001):
+                gen_str(2000, string.ascii_letters, 20)
+            with open(path + '.collapsed') as f:
+                got = f.read()
+
+            self.assertFalse(os.path.exists(path))
+        self.assertIn('gen_str', got)
+
+
+class TestEngines(unittest.TestCase):
+    def test_bulk_format(self):
+        """
+        Test row count and format of the bulk engine
+        """
+        random.seed(0)
+        strs = gen_str_bulk(100, 'abc', 7).split('\n')
+        ints = gen_int_bulk(100).split('\n')
+        floats = gen_float_bulk(100, 'uniform', 2, 3, 0, 0).split('\n')
+
+        self.assertTrue(strs[-1] == ints[-1] == floats[-1] == '')
+        self.assertTrue(all(len(x) == 7 and set(x) <= set('abc') for x in strs[:-1]))
+        self.assertTrue(all(-2 ** 63 <= int(x) < 2 ** 63 for x in ints[:-1]))
+        self.assertTrue(all(2 <= float(x) <= 3 for x in floats[:-1]))
+        self.assertTrue(len(strs) == len(ints) == len(floats) == 101)
+
+    def test_bulk_seed(self):
+        """
+        Test if seed change affects output of the bulk engine
+        """
+        random.seed(1)
+        got1 = gen_str_bulk(10, string.ascii_letters, 5) + gen_int_bulk(10)
+        random.seed(2)
+        got2 = gen_str_bulk(10, string.ascii_letters, 5) + gen_int_bulk(10)
+        random.seed(1)
+        got3 = gen_str_bulk(10, string.ascii_letters, 5) + gen_int_bulk(10)
+
+        self.assertTrue(got1 == got3 and got1 != got2)
+
+    def test_select_engine(self):
+        """
+        Test engine selection for small jobs, calibration and the cache
+        """
+        args = argparse.Namespace(type='int', data_num=10 ** 7)
+        with tempfile.TemporaryDirectory() as tmp:
+            cache = os.path.join(tmp, 'engines.json')
+
+            small = select_engine(argparse.Namespace(type='int', data_num=10), cache)
+            self.assertFalse(os.path.exists(cache))
+            random.seed(0)
+            state = random.getstate()
+            with mock.patch.object(gen, 'CALIBRATION_WORK', 2000):
+                select_engine(args, cache)
+            self.assertEqual(random.getstate(), state)
+            with open(cache, 'w') as f:
+                json.dump({'int': {'classic': 2.0, 'bulk': 1.0, 'numpy': 0.5}}, f)
+            cached = select_engine(args, cache)
+
+        self.assertEqual(small, 'bulk')
+        self.assertEqual(cached, 'classic')
+
+    def test_select_engine_fixed(self):
+        """
+        Test if seeded jobs and jobs that ignore the engine are not calibrated
+        """
+        with tempfile.TemporaryDirectory() as tmp:
+            cache = os.path.join(tmp, 'engines.json')
+            jobs = [dict(unique=True), dict(from_file='corpus.txt'),
+                    dict(length_dist='uniform'), dict(seed=1)]
+            got = [select_engine(argparse.Namespace(type='str', length=8, data_num=10 ** 7, **job),
+                                 cache) for job in jobs]
+
+            self.assertFalse(os.path.exists(cache))
+        self.assertEqual(got, ['classic', 'classic', 'classic', 'bulk'])
+
+    def test_prepare_order(self):
+        """
+        Test if engine auto is resolved before the Bloom filter is created
+        """
+        def select(args):
+            self.assertIsNone(getattr(args, 'seen', None))
+            return 'bulk'
+
+        with tempfile.TemporaryDirectory() as tmp:
+            args = gen.argparser(['100', '-t', 'str', '--unique', '--engine', 'auto',
+                                  '-f', os.path.join(tmp, 'out.txt')])
+            with mock.patch.object(gen, 'select_engine', side_effect=select) as patched:
+                gen.prepare(args)
+
+        self.assertEqual(patched.call_count, 1)
+        self.assertEqual(args.seen.rejected, 0)
+
+    def test_timeit_engine(self):
+        """
+        Test if --timeit reports the engine only when it was chosen explicitly
+        """
+        script = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'gen.py')
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, 'out.txt')
+            reports = [subprocess.run([sys.executable, script, '100', '-f', path, '--timeit', *opts],
+                                      check=True, capture_output=True, text=True).stdout
+                       for opts in ([], ['--engine', 'bulk'], ['--secure'])]
+
+        self.assertNotIn('Engine:', reports[0])
+        self.assertIn('Engine: bulk', reports[1])
+        self.assertIn('Engine: secure', reports[2])
+
+
+class TestSecure(unittest.TestCase):
+    def test_secure_indices(self):
+        """
+        Test range and uniformity of secure random integers
+        """
+        for m in (3, 256, 1000):
+            got = list(secure_indices(30000, m))
+
+            self.assertEqual(len(got), 30000)
+            self.assertTrue(all(0 <= i < m for i in got))
+            counts = collections.Counter(got)
+            self.assertGreater(chi_square([counts[i] for i in range(m)])[2], 0.0001)
+
+    def test_secure_str(self):
+        """
+        Test charset and length of secure strings
+        """
+        for charset in ('abc', 'αβγδ'):
+            rows = gen_str_secure(100, charset, 8).split('\n')[:-1]
+
+            self.assertEqual(len(rows), 100)
+            self.assertTrue(all(len(x) == 8 and set(x) <= set(charset) for x in rows))
+
+    def test_secure_numbers(self):
+        """
+        Test format and randomness of secure numbers
+        """
+        ints = gen_int_secure(10)
+        uniform = gen_float_secure(1000, 'uniform', -1, 1, 0, 0).split()
+        normal = gen_float_secure(1001, 'normal', 0, 0, 5, 0.5).split()
+
+        self.assertNotEqual(ints, gen_int_secure(10))
+        self.assertEqual(ints.count('\n'), 10)
+        self.assertTrue(all(-1 <= float(x) <= 1 for x in uniform))
+        self.assertEqual(len(normal), 1001)
+        self.assertAlmostEqual(sum(map(float, normal)) / 1001, 5, delta=0.1)
+
+
+class TestCheckpoint(unittest.TestCase):
+    def test_resume(self):
+        """
+        Test if a resumed run is byte-identical to an uninterrupted one
+        """
+        with tempfile.TemporaryDirectory() as tmp:
+            args = argparse.Namespace(type='str', charset=string.ascii_letters, length=7,
+                                      engine='classic', seed=3, data_num=5000,
+                                      checkpoint_every=1200,
+                                      filename=os.path.join(tmp, 'out.txt'))
+            patch = mock.patch.object(gen, 'BATCH_SIZE', 1000)
+            patch.start()
+            self.addCleanup(patch.stop)
+            random.seed(3)
+            write_checkpointed(args, args.data_num)
+            with open(args.filename, 'rb') as f:
+                expected = f.read()
+
+            calls = []
+
+            def crash(*a):
+                calls.append(a)
+                if len(calls) > 4:
+                    raise KeyboardInterrupt
+                return generate(*a)
+
+            random.seed(3)
+            with mock.patch.object(gen, 'generate', crash):
+                with self.assertRaises(KeyboardInterrupt):
+                    write_checkpointed(args, args.data_num)
+            with open(args.filename, 'ab') as f:
+                f.write(b'partial row')
+            ckpt = load_checkpoint(args.filename)
+            random.seed(12345)
+            write_checkpointed(args, args.data_num, ckpt)
+            with open(args.filename, 'rb') as f:
+                got = f.read()
+
+            self.assertEqual(ckpt['rows'], 2400)
+            self.assertEqual(got, expected)
+            self.assertIsNone(load_checkpoint(args.filename))
+
+    def test_changed_options(self):
+        """
+        Test if a checkpoint of a run with other options is rejected
+        """
+        args = argparse.Namespace(type='int', seed=1)
+        ckpt = {'rows': 10, 'offset': 100, 'state': random.getstate(),
+                'args': gen.checkpoint_key(argparse.Namespace(type='int', seed=2))}
+
+        with self.assertRaises(ValueError):
+            write_checkpointed(args, 20, ckpt)
+
+    def test_missing_output(self):
+        """
+        Test if a checkpoint whose output file is gone is rejected
+        """
+        with tempfile.TemporaryDirectory() as tmp:
+            args = argparse.Namespace(type='int', seed=1, filename=os.path.join(tmp, 'out.txt'))
+            ckpt = {'rows': 10, 'offset': 100, 'state': random.getstate(),
+                    'args': gen.checkpoint_key(args)}
+
+            with self.assertRaisesRegex(ValueError, 'missing'):
+                write_checkpointed(args, 20, ckpt)
+            self.assertFalse(os.path.exists(args.filename))
+
+
+class TestRowIndex(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmp.name, 'out.txt')
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_read_rows(self):
+        """
+        Test if rows read through a strided index match the file
+        """
+        random.seed(0)
+        for stride in (1, 7, 64):
+            args = argparse.Namespace(type='int', filename=self.path,
+                                      index=True, index_stride=stride)
+            with open_output(args) as f:
+                stream(args, f, 1000)
+            with open(self.path) as f:
+                rows = f.read().split('\n')[:-1]
+
+            with LineIndex(self.path) as index:
+                self.assertEqual((index.stride, index.rows), (stride, 1000))
+            for start, stop in ((0, 1), (6, 15), (63, 64), (990, 1005), (500, 500)):
+                got = read_rows(self.path, start, stop)
+                self.assertEqual(got, ''.join(x + '\n' for x in rows[start:stop]))
+
+    def test_resume_index(self):
+        """
+        Test if the index of a resumed run matches an uninterrupted one
+        """
+        args = argparse.Namespace(type='int', engine='classic', data_num=30000,
+                                  checkpoint_every=12000, filename=self.path,
+                                  index=True, index_stride=5)
+        random.seed(0)
+        write_checkpointed(args, args.data_num)
+        with open(self.path + '.idx', 'rb') as f:
+            expected = f.read()[40:]
+
+        calls = []
+
+        def crash(*a):
+            calls.append(a)
+            if len(calls) > 2:
+                raise KeyboardInterrupt
+            return generate(*a)
+
+        random.seed(0)
+        with mock.patch.object(gen, 'generate', crash):
+            with self.assertRaises(KeyboardInterrupt):
+                write_checkpointed(args, args.data_num)
+        write_checkpointed(args, args.data_num, load_checkpoint(self.path))
+        with open(self.path + '.idx', 'rb') as f:
+            got = f.read()[40:]
+
+        self.assertEqual(got, expected)
+        with LineIndex(self.path) as index:
+            self.assertEqual((index.stride, index.rows), (5, 30000))
+
+    def test_chunked_write(self):
+        """
+        Test if offsets of a large write match with and without numpy
+        """
+        random.seed(0)
+        text = ''.join(f'{"x" * random.choice((0, 1, 2, 90))}\n' for _ in range(3000))
+        offsets = list(itertools.accumulate(len(x) + 1 for x in text.split('\n')[:-1]))
+        args = argparse.Namespace(filename=self.path, index=True)
+        for stride, no_numpy in itertools.product((1, 7, 64), (False, True)):
+            args.index_stride = stride
+            with mock.patch.object(gen, 'CHUNK_SIZE', 1000), \
+                    mock.patch.object(importlib.util, 'find_spec',
+                                      return_value=None if no_numpy else importlib.util.find_spec('numpy')):
+                with open_output(args) as f:
+                    f.write(text)
+            with open(self.path + '.idx', 'rb') as f:
+                got = memoryview(f.read()[40:]).cast('Q').tolist()
+
+            with self.subTest(stride=stride, no_numpy=no_numpy):
+                self.assertEqual(got, [0] + offsets[stride - 1::stride] +
+                                 ([len(text)] if 3000 % stride else []))
+
+    def test_rows_main_missing(self):
+        """
+        Test if the rows subcommand reports a missing file
+        """
+        with self.assertRaises(SystemExit) as cm:
+            gen.rows_main([os.path.join(self.tmp.name, 'missing.txt'), '0', '5'])
+
+        self.assertTrue(cm.exception.code.startswith('GEN: error:'))
+
+
+class TestJobs(unittest.TestCase):
+    def test_job_argv(self):
+        """
+        Test conversion of a dataset definition to command-line arguments
+        """
+        job = {'name': 'keys', 'data_num': 10, 'type': 'str', 'charset': '-ab',
+               'index': True, 'unique': False, 'index-stride': 4}
+
+        got = job_argv(job, make_parser())
+
+        self.assertEqual(got, ['10', '--type=str', '--charset=-ab', '--index', '--index-stride=4'])
+        with self.assertRaises(ValueError):
+            job_argv({'bogus': 1}, make_parser())
+
+    def test_job_argv_lists(self):
+        """
+        Test if list values are joined and tables are rejected
+        """
+        got = job_argv({'length-weights': [[3, 1], [8, 2.5]]}, make_parser())
+        joined = job_argv({'length-weights': ['3:1', '8:2.5']}, make_parser())
+
+        self.assertEqual(got, ['--length-weights=3:1,8:2.5'])
+        self.assertEqual(joined, got)
+        with self.assertRaises(ValueError):
+            job_argv({'length-weights': {'3': 1}}, make_parser())
+
+    def test_jobs_options(self):
+        """
+        Test if options other than --workers are rejected with --jobs
+        """
+        args = gen.argparser(['--jobs', 'spec.toml', '--workers', '2'])
+        with mock.patch.object(os, 'cpu_count', return_value=None):
+            default = gen.argparser(['--jobs', 'spec.toml'])
+        with self.assertRaises(SystemExit) as cm:
+            gen.argparser(['10', '--jobs', 'spec.toml', '-t', 'str'])
+
+        self.assertEqual(args.workers, 2)
+        self.assertEqual(default.workers, 1)
+        self.assertIn('data_num, --type cannot be used with --jobs', cm.exception.code)
+
+    def test_shared_corpus(self):
+        """
+        Test if jobs sampling one file succeed and jobs sharing an output are rejected
+        """
+        with tempfile.TemporaryDirectory() as tmp:
+            corpus = os.path.join(tmp, 'corpus.txt')
+            with open(corpus, 'w') as f:
+                f.writelines(f'line {i}\n' for i in range(1000))
+            spec = os.path.join(tmp, 'spec.json')
+            jobs = [{'data_num': 100, 'seed': i, 'from-file': corpus,
+                     'filename': os.path.join(tmp, f'{i}.txt')} for i in range(3)]
+            with open(spec, 'w') as f:
+                json.dump(jobs, f)
+            with contextlib.redirect_stdout(io.StringIO()) as out:
+                run_jobs(argparse.Namespace(jobs=spec, workers=3))
+            leftovers = [name for name in os.listdir(tmp) if name.endswith('.tmp')]
+
+            jobs[2]['filename'] = jobs[0]['filename']
+            with open(spec, 'w') as f:
+                json.dump(jobs, f)
+            with self.assertRaises(SystemExit) as cm:
+                run_jobs(argparse.Namespace(jobs=spec, workers=3))
+
+        self.assertNotIn('failed', out.getvalue())
+        self.assertEqual(leftovers, [])
+        self.assertIn('is also used by', cm.exception.code)
+
+    def test_run_jobs(self):
+        """
+        Test if datasets of a spec file match separate runs
+        """
+        with tempfile.TemporaryDirectory() as tmp:
+            spec = os.path.join(tmp, 'spec.json')
+            jobs = [{'data_num': 500 + i, 'seed': i, 'type': 'str', 'length': 4,
+                     'filename': os.path.join(tmp, f'{i}.txt')} for i in range(4)]
+            with open(spec, 'w') as f:
+                json.dump({'defaults': {'engine': 'bulk'}, 'jobs': jobs}, f)
+
+            loaded = load_jobs(spec)
+            with contextlib.redirect_stdout(io.StringIO()) as out:
+                run_jobs(argparse.Namespace(jobs=spec, workers=2))
+            got = []
+            for job in jobs:
+                with open(job['filename']) as f:
+                    got.append(f.read())
+
+        self.assertEqual([job['engine'] for job in loaded], ['bulk'] * 4)
+        for i, data in enumerate(got):
+            random.seed(i)
+            self.assertEqual(data, gen_str_bulk(500 + i, string.ascii_letters + string.digits
+                                                + string.punctuation, 4))
+        self.assertIn('Total: 4 datasets', out.getvalue())
+
+
 class TestGenInt(unittest.TestCase):
     def test_num_int(self):
         """
@@ -94,11 +821,11 @@ class TestGenInt(unittest.TestCase):
         Test if generated integers are random
         """
         random.seed(0)
-        data_num = 10
+        data_num = 1000
 
-        got = [gen_int(data_num) for _ in range(1000)]
+        got = gen_int(data_num).split('\n')[:-1]
 
-        self.assertTrue(len(set(got)) == len(got))
+        self.assertTrue(len(set(got)) == len(got) == data_num)
 
     def test_seed_int(self):
         """
@@ -136,15 +863,15 @@ class TestGenFloat(unittest.TestCase):
         Test if generated floats are random
         """
         random.seed(0)
-        data_num = 10
+        data_num = 1000
         distribution = 'uniform'
         min_value = 0
         max_value = 1
 
-        got = [gen_float(data_num, distribution, min_value,
-                         max_value, 0, 0) for _ in range(1000)]
+        got = gen_float(data_num, distribution, min_value,
+                        max_value, 0, 0).split('\n')[:-1]
 
-        self.assertTrue(len(set(got)) == len(got))
+        self.assertTrue(len(set(got)) == len(got) == data_num)
 
     def test_seed_float(self):
         """
@@ -208,5 +935,378 @@ class TestGenFloat(unittest.TestCase):
         self.assertTrue(counter <= data_num * 0.3 / 100)
 
 
+class TestStream(unittest.TestCase):
+    def test_num_stream(self):
+        """
+        Test if stream writes the same rows as generate
+        """
+        args = argparse.Namespace(type='int')
+        out = io.StringIO()
+
+        random.seed(1)
+        done, _ = stream(args, out, 25000)
+        random.seed(1)
+        expected = generate(args, 25000)
+
+        self.assertEqual(done, 25000)
+        self.assertEqual(out.getvalue(), expected)
+
+    def test_rate(self):
+        """
+        Test if stream keeps to the requested rate
+        """
+        args = argparse.Namespace(type='int')
+        out = io.StringIO()
+
+        start = time.monotonic()
+        done, elapsed = stream(args, out, 20000, rate=100000)
+        wall = time.monotonic() - start
+
+        self.assertEqual(out.getvalue().count('\n'), done)
+        self.assertGreaterEqual(wall, 0.19)
+        self.assertLess(abs(done / elapsed - 100000), 10000)
+
+    def test_stall(self):
+        """
+        Test if the batch size returns to rate * TICK after a stalled write
+        """
+        class Stalling(io.StringIO):
+            def __init__(self):
+                super().__init__()
+                self.batches = []
+
+            def write(self, s):
+                self.batches.append(s.count('\n'))
+                if len(self.batches) == 3:
+                    time.sleep(0.3)
+                return super().write(s)
+
+        out = Stalling()
+        done, _ = stream(argparse.Namespace(type='int'), out, 1200, rate=2000)
+
+        self.assertEqual(done, 1200)
+        self.assertGreater(max(out.batches), 20)
+        self.assertEqual(out.batches[-5:], [20] * 5)
+
+
+class TestVerify(unittest.TestCase):
+    def test_chi_square(self):
+        """
+        Test chi-square p-value against a known value
+        """
+        stat, df, p_value = chi_square([10, 20, 30])
+
+        self.assertEqual((stat, df), (10.0, 2))
+        self.assertAlmostEqual(p_value, 0.006737947, places=6)
+
+    def test_verify_str(self):
+        """
+        Test if generated strings pass verification
+        """
+        random.seed(0)
+        args = argparse.Namespace(type='str', charset=string.ascii_letters)
+        data = gen_str(2000, args.charset, 10).encode()
+
+        report = verify(io.BytesIO(data), args)
+
+        self.assertEqual(report['rows'], 2000)
+        self.assertEqual(report['errors'], [])
+        self.assertGreater(report['tests'][0][3], 0.001)
+
+    def test_verify_normal(self):
+        """
+        Test if KS test detects wrong normal distribution parameters
+        """
+        random.seed(0)
+        data = gen_float(20000, 'normal', 0, 0, 5, 0.5).encode()
+        args = argparse.Namespace(type='float', distribution='normal',
+                                  mean=5, std=0.5)
+
+        good = verify(io.BytesIO(data), args)
+        args.mean = 5.1
+        bad = verify(io.BytesIO(data), args)
+
+        self.assertGreater(good['tests'][0][3], 0.001)
+        self.assertLess(bad['tests'][0][3], 0.001)
+
+    def test_verify_duplicates(self):
+        """
+        Test duplicate rows estimate
+        """
+        random.seed(0)
+        data = gen_int(5000).encode()
+
+        report = verify(io.BytesIO(data * 2), argparse.Namespace(type='int'))
+
+        self.assertEqual(report['rows'], 10000)
+        self.assertAlmostEqual(report['distinct'], 5000, delta=50)
+
+    @unittest.skipIf(importlib.util.find_spec('numpy') is None, 'numpy is not installed')
+    def test_verify_numpy(self):
+        """
+        Test if floats binned with numpy give the same report as without it
+        """
+        random.seed(0)
+        for args in (argparse.Namespace(type='float', distribution='normal', mean=5, std=0.5),
+                     argparse.Namespace(type='float', distribution='uniform',
+                                        min_value=0.2, max_value=0.8)):
+            with self.subTest(distribution=args.distribution):
+                data = gen_float(20000, 'uniform', 0, 1, 0, 0) if args.distribution == 'uniform' \
+                    else gen_float(20000, 'normal', 0, 0, 5, 0.5)
+                fast = verify(io.BytesIO(data.encode()), args)
+                with mock.patch.object(gen.importlib.util, 'find_spec', return_value=None):
+                    slow = verify(io.BytesIO(data.encode()), args)
+                self.assertEqual(fast['errors'], slow['errors'])
+                self.assertAlmostEqual(fast['tests'][0][1], slow['tests'][0][1], places=6)
+
+    def test_distinct_sketch(self):
+        """
+        Test if the distinct rows sketch is exact below k and close above it
+        """
+        small = KMinValues(1024)
+        small.update([b'%d' % i for i in range(1000)] * 2)
+        large = KMinValues(1024)
+        for start in range(0, 100000, 7000):
+            large.update([b'%d' % i for i in range(start, min(start + 7000, 100000))])
+
+        self.assertEqual((small.count(), small.error()), (1000, 0.0))
+        self.assertAlmostEqual(large.count(), 100000, delta=4 * large.error() * 100000)
+
+    def test_verify_foreign(self):
+        """
+        Test if characters outside the charset are counted in every block
+        """
+        args = argparse.Namespace(type='str', charset='ab')
+        data = 'ab\naé\nc#\n'.encode()
+
+        with mock.patch.object(gen, 'CHAR_SAMPLE', 1):
+            report = verify(io.BytesIO(data), args)
+
+        self.assertEqual(report['errors'], ['3 characters outside the charset'])
+
+    def test_verify_main(self):
+        """
+        Test duplicate rate output and errors on a malformed float and a missing file
+        """
+        report = {'rows': 1000, 'distinct': 998, 'distinct_error': 0.004,
+                  'tests': [], 'errors': []}
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, 'data.txt')
+            with open(path, 'w') as f:
+                f.write('0.5\nabc\n')
+            out = io.StringIO()
+            with contextlib.redirect_stdout(out), \
+                    mock.patch.object(gen, 'verify', return_value=report):
+                verify_main([path])
+            with self.assertRaises(SystemExit) as cm:
+                verify_main(['-t', 'float', '-d', 'uniform',
+                             '--min_value', '0', '--max_value', '1', path])
+            with self.assertRaises(SystemExit) as missing:
+                verify_main([os.path.join(tmp, 'missing.txt')])
+
+        self.assertIn('duplicate rate (estimate): indistinguishable from zero', out.getvalue())
+        self.assertTrue(str(cm.exception.code).startswith('GEN: error:'))
+        self.assertTrue(str(missing.exception.code).startswith('GEN: error:'))
+
+
+class TestProperties(unittest.TestCase):
+    """Cheap properties every engine must hold
+
+    Each check seeds its own generator and uses no shared files, so the
+    suite may run in parallel (e.g. pytest -n auto with pytest-xdist).
+    """
+
+    engines = ('classic', 'bulk', 'secure')
+
+    def make_args(self, engine, type, **kwargs):
+        defaults = {'str': dict(charset='xyz', length=6),
+                    'int': {},
+                    'float': dict(distribution='uniform', min_value=2, max_value=3,
+                                  mean=0, std=0)}[type]
+        defaults.update(kwargs)
+        return argparse.Namespace(type=type, engine=engine, **defaults)
+
+    def test_row_count(self):
+        """
+        Test if every engine writes exactly the requested rows
+        """
+        for engine in self.engines:
+            for type in ('str', 'int', 'float'):
+                with self.subTest(engine=engine, type=type):
+                    for n in (0, 1, 777):
+                        got = generate(self.make_args(engine, type), n)
+                        self.assertEqual(got.count('\n'), n)
+                        self.assertTrue(got == '' or got.endswith('\n'))
+
+    def test_charset_membership(self):
+        """
+        Test if generated strings have the length and charset requested
+        """
+        for engine in self.engines:
+            with self.subTest(engine=engine):
+                args = self.make_args(engine, 'str')
+                rows = generate(args, 2000).split('\n')[:-1]
+                self.assertTrue(all(len(x) == 6 for x in rows))
+                self.assertEqual(set(''.join(rows)), set(args.charset))
+
+    def test_bounds(self):
+        """
+        Test if integers and uniform floats stay within their ranges
+        """
+        for engine in self.engines:
+            with self.subTest(engine=engine):
+                ints = generate(self.make_args(engine, 'int'), 2000).split('\n')[:-1]
+                floats = generate(self.make_args(engine, 'float'), 2000).split('\n')[:-1]
+                self.assertTrue(all(-2 ** 63 <= int(x) < 2 ** 63 for x in ints))
+                self.assertTrue(all(2 <= float(x) <= 3 for x in floats))
+
+    def test_seed_determinism(self):
+        """
+        Test if seeded engines repeat their output and secure does not
+        """
+        for engine in self.engines:
+            for type in ('str', 'int', 'float'):
+                with self.subTest(engine=engine, type=type):
+                    args = self.make_args(engine, type)
+                    random.seed(7)
+                    got1 = generate(args, 200)
+                    random.seed(7)
+                    got2 = generate(args, 200)
+                    self.assertEqual(got1 == got2, engine != 'secure')
+
+    def test_distribution(self):
+        """
+        Test if every engine passes the verify goodness-of-fit tests
+        """
+        cases = [('str', {}, dict(charset='xyz')),
+                 ('int', {}, {}),
+                 ('float', {}, dict(distribution='uniform', min_value=2, max_value=3)),
+                 ('float', dict(distribution='normal', mean=5, std=0.5),
+                  dict(distribution='normal', mean=5, std=0.5))]
+        for engine in self.engines:
+            for type, options, check in cases:
+                with self.subTest(engine=engine, type=type, **options):
+                    random.seed(0)
+                    data = generate(self.make_args(engine, type, **options), 20000)
+                    report = verify(io.BytesIO(data.encode()),
+                                    argparse.Namespace(type=type, **check))
+                    self.assertEqual(report['errors'], [])
+                    for name, _, _, p_value in report['tests']:
+                        self.assertGreater(p_value, 1e-4, name)
+
+
+LARGE_TESTS = os.environ.get('GEN_LARGE_TESTS', '') not in ('', '0')
+LARGE_ROWS = int(os.environ.get('GEN_LARGE_ROWS', 10 ** 7))
+LARGE_MIN_RATE = {'classic': 50000, 'bulk': 100000, 'secure': 100000}
+LARGE_MAX_GROWTH = 64 << 20
+
+
+def current_rss() -> int:
+    """Returns the current resident set size of the process in bytes"""
+    with open('/proc/self/statm') as f:
+        return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+
+
+class RssProbe(io.RawIOBase):
+    """Stream wrapper that records the largest resident set size seen on every read or write"""
+
+    def __init__(self, stream):
+        self.stream = stream
+        self.peak = current_rss()
+
+    def readable(self):
+        return True
+
+    def writable(self):
+        return True
+
+    def read(self, size=-1):
+        self.peak = max(self.peak, current_rss())
+        return self.stream.read(size)
+
+    def write(self, s):
+        self.peak = max(self.peak, current_rss())
+        return self.stream.write(s)
+
+
+class CountingSink(io.TextIOBase):
+    """Writable text stream that only counts rows and characters"""
+
+    def __init__(self):
+        self.rows = 0
+        self.chars = 0
+
+    def writable(self):
+        return True
+
+    def write(self, s):
+        self.rows += s.count('\n')
+        self.chars += len(s)
+        return len(s)
+
+
+@unittest.skipUnless(LARGE_TESTS, 'set GEN_LARGE_TESTS=1 to run large-scale tests')
+@unittest.skipUnless(os.path.exists('/proc/self/statm'), 'needs /proc/self/statm')
+class TestLargeScale(unittest.TestCase):
+    """Streaming memory bounds and throughput floors at GEN_LARGE_ROWS rows
+
+    The resident set size, sampled on every write or read, may not grow
+    by more than LARGE_MAX_GROWTH however many rows are processed, and
+    every engine has to keep above its LARGE_MIN_RATE rows per second.
+    """
+
+    def check_stream(self, args, out):
+        before = current_rss()
+        probe = RssProbe(out)
+        random.seed(0)
+        done, wall = stream(args, probe, LARGE_ROWS)
+
+        self.assertEqual(done, LARGE_ROWS)
+        self.assertLess(probe.peak - before, LARGE_MAX_GROWTH)
+        self.assertGreater(done / wall, LARGE_MIN_RATE[args.engine])
+
+    def test_stream(self):
+        """
+        Test streaming memory and rate of every engine
+        """
+        for engine in ('classic', 'bulk', 'secure'):
+            for type, options in (('str', dict(charset=string.ascii_letters, length=16)),
+                                  ('int', {})):
+                with self.subTest(engine=engine, type=type):
+                    out = CountingSink()
+                    self.check_stream(argparse.Namespace(type=type, engine=engine, **options), out)
+                    self.assertEqual(out.rows, LARGE_ROWS)
+                    if type == 'str':
+                        self.assertEqual(out.chars, LARGE_ROWS * 17)
+
+    def test_indexed_file(self):
+        """
+        Test an indexed file: memory while writing, random access and verification
+        """
+        args = argparse.Namespace(type='float', engine='bulk', distribution='normal',
+                                  min_value=0, max_value=0, mean=5, std=0.5,
+                                  index=True, index_stride=1024)
+        with tempfile.TemporaryDirectory() as tmp:
+            args.filename = os.path.join(tmp, 'out.txt')
+            with open_output(args) as f:
+                self.check_stream(args, f)
+
+            index = LineIndex(args.filename, 1024)
+            rows = index.rows
+            index.close()
+            last = read_rows(args.filename, LARGE_ROWS - 3, LARGE_ROWS)
+            before = current_rss()
+            with open(args.filename, 'rb') as f:
+                probe = RssProbe(f)
+                report = verify(probe, args)
+
+        self.assertEqual(rows, LARGE_ROWS)
+        self.assertEqual(last.count('\n'), 3)
+        self.assertLess(probe.peak - before, LARGE_MAX_GROWTH)
+        self.assertEqual(report['rows'], LARGE_ROWS)
+        self.assertEqual(report['errors'], [])
+        self.assertGreater(report['tests'][0][3], 1e-4)
+
+
 if __name__ == "__main__":
     unittest.main()